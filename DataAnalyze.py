@@ -1,126 +1,247 @@
 import os
-from utils.read import *
-from utils.data import *
-from utils.draw import *
-from utils.excel import *
+from contextlib import nullcontext
+import numpy as np
+from utils.anchors import clusterAnchors
+from utils.cache import AnnotationCache
+from utils.profiling import Profiler, stage
+from utils.read import READERS
+from utils.statistics import Statistics, StatisticsAccumulator
+from utils.validate import validateTable, writeIssues
 
 class DataAnalyze:
     """
-    voc or coco dataset analyze
+    voc, coco, yolo or csv dataset analyze, see utils.read.READERS
     """
-    def __init__(self, type, path, outPath):
+    def __init__(self, type, path, outPath, streamJson=False, workers=1, cache=True, rebuildCache=False,
+                 densityThreshold=100000, densityBins=256, densityLog=True, plotWorkers=1, categoryPlots=True,
+                 rawFormat='xlsx', summaryFormat='xlsx', streaming=False, chunkSize=1000, sampleSize=100000,
+                 shard=None, anchorNum=0, anchorRestarts=10, anchorWorkers=1, anchorSampleSize=100000,
+                 overlap=False, overlapIoU=0.5, duplicateIoU=0.9, validate=False, imageDir=None, validateWorkers=8,
+                 profile=False, profileFile=None, cprofileStage=None, statsOnly=False, names=None):
         """
-        :param type: dataset format, optional: 'coco', 'voc'
-        :param path: dataset path
-        :param outPath: result path
+        :param type: dataset format, one of utils.read.READERS ('coco', 'voc', 'yolo', 'csv'),
+                     or 'merge' to combine the partial statistics of shards
+        :param path: dataset path: coco json file, voc xml directory, yolo label directory or csv file,
+                     for 'merge' the list of partial statistics files
+        :param outPath: result path, may be None when statsOnly is set
+        :param streamJson: parse coco json incrementally, for files larger than RAM, implied by streaming
+        :param workers: number of processes used to parse voc xml files
+        :param cache: keep parsed annotation files in outPath/cache.sqlite so re-runs only parse changed files
+        :param rebuildCache: drop the cache before reading
+        :param densityThreshold: scatter plots with more points than this are drawn as a 2D histogram
+        :param densityBins: number of bins on each axis of the 2D histogram
+        :param densityLog: log color scale for the 2D histogram
+        :param plotWorkers: number of processes rendering figures
+        :param categoryPlots: draw the per-category bbox W & H scatters
+        :param rawFormat: export format of the W & H tables, 'xlsx', 'workbook', 'csv' or 'parquet'
+        :param summaryFormat: export format of the count tables, 'xlsx', 'workbook', 'csv' or 'parquet'
+        :param streaming: fold images into StatisticsAccumulator chunk by chunk instead of keeping every W & H value,
+                          scatters and W & H tables then use a sample of sampleSize points
+        :param chunkSize: number of images per chunk in streaming mode
+        :param sampleSize: number of W & H points kept in streaming mode
+        :param shard: (index, count), only analyze the index-th of count consecutive blocks of images and write
+                      its partial statistics to outPath instead of the results
+        :param anchorNum: number of anchors clustered from the bbox W & H with IoU k-means, 0 to skip clustering
+        :param anchorRestarts: number of k-means runs, the one with the highest mean IoU is kept
+        :param anchorWorkers: number of processes running k-means restarts
+        :param anchorSampleSize: number of boxes k-means runs on, 0 to use every box
+        :param overlap: analyze the overlaps between the boxes of each image and report duplicate boxes
+        :param overlapIoU: IoU from which a box counts as overlapping another one in the per-category counts
+        :param duplicateIoU: IoU from which a pair of boxes of the same image is reported as duplicate
+        :param validate: check annotated image sizes and box bounds and write the issues to outPath/issues.json
+        :param imageDir: image directory, when given the annotated sizes are compared with the image headers.
+                         yolo reads the image sizes from it, by default its label directory with 'labels' replaced by 'images'
+        :param validateWorkers: number of threads reading image headers
+        :param profile: print the wall time, CPU time, peak RSS and item count of every stage
+        :param profileFile: also write the profile of every stage to this json file
+        :param cprofileStage: run this stage, e.g. 'analyze' or 'draw', under cProfile and
+                              write its stats to outPath/profile-{stage}.prof
+        :param names: category names file of yolo labels, one name per line
+        :param statsOnly: only compute the statistics into self.statistics and print the summary, no file is
+                          written and matplotlib / openpyxl are never imported. the cache is not used
         """
         self.outPath = outPath
+        self.statsOnly = statsOnly
+        if statsOnly:
+            cache = False
+        self.drawOptions = {'densityThreshold': densityThreshold, 'densityBins': densityBins, 'densityLog': densityLog,
+                            'workers': plotWorkers, 'categoryPlots': categoryPlots}
+        self.exportOptions = {'rawFormat': rawFormat, 'summaryFormat': summaryFormat}
+        self.anchorOptions = {'k': anchorNum, 'restarts': anchorRestarts, 'workers': anchorWorkers,
+                              'sampleSize': anchorSampleSize}
+        self.overlapOptions = {'overlapIoU': overlapIoU, 'duplicateIoU': duplicateIoU} if overlap else None
+        self.validateOptions = {'imageDir': imageDir, 'workers': validateWorkers} if validate else None
+        self.issues = []
+        self.profiler = None
+        if profile or profileFile is not None or cprofileStage is not None:
+            cprofileFile = os.path.join(outPath, f'profile-{cprofileStage}.prof') if cprofileStage and not statsOnly else None
+            self.profiler = Profiler(cprofileStage, cprofileFile)
 
-        if not os.path.exists(self.outPath):
+        if not statsOnly and not os.path.exists(self.outPath):
             os.makedirs(self.outPath)
 
         print('Processing, please wait...')
 
-        if type == 'coco':
-            self.analyzeInfo(readCoco(path))
-            self.output()
-        elif type == 'voc':
-            self.analyzeInfo(readVoc(path))
-            self.output()
-        else:
-            print('Currently only voc and coco formats are supported, please check if the first parameter is correct.')
-        
-        print(f'Processing completed. The result is saved in {self.outPath}.')
+        with (self.profiler.activate() if self.profiler is not None else nullcontext()):
+            self.run(type, path, streaming, chunkSize, sampleSize, shard, cache, rebuildCache,
+                     {'stream': streamJson, 'workers': workers, 'imageDir': imageDir, 'names': names})
+        if self.profiler is not None:
+            self.profiler.summary()
+            if profileFile is not None:
+                self.profiler.dump(profileFile)
+                print(f'Profile written to {profileFile}.')
 
-    def calEachCategorieNum(self, categorie):
-        if categorie not in self.eachCategoriesNum.keys():
-            self.eachCategoriesNum.update({categorie: 1})
+        if statsOnly:
+            print('Processing completed.')
         else:
-            self.eachCategoriesNum[categorie] += 1
+            print(f'Processing completed. The result is saved in {self.outPath}.')
 
+    @classmethod
+    def compute(cls, type, path, **options):
+        """
+        analyze a dataset and return its statistics without writing any file
+        e.g. DataAnalyze.compute('coco', 'train.json', streaming=True).eachCategoriesNum
+        :param type: dataset format, one of utils.read.READERS or 'merge'
+        :param path: dataset path, for 'merge' the list of partial statistics files
+        :param options: keyword arguments of __init__, the figure and table options are ignored
+        :return: utils.statistics.Statistics
+        """
+        if type != 'merge' and type not in READERS:
+            raise ValueError(f"Unknown dataset format '{type}', supported formats are {', '.join(READERS)} and merge")
+        return cls(type, path, None, statsOnly=True, **options).statistics
 
-    def calEachCategorieBbox(self, categorie, bboxWH):
-        if categorie not in self.eachCategoriesBbox.keys():
-            self.eachCategoriesBbox.update({categorie: [[bboxWH[0]], [bboxWH[1]]]})
-        else:
-            self.eachCategoriesBbox[categorie][0].append(bboxWH[0])
-            self.eachCategoriesBbox[categorie][1].append(bboxWH[1])
-
-
-    def analyzeInfo(self, info_data):
-        self.imagesWH = [[], []]
-        self.bboxsWH = [[], []]
-        self.anchorRatios = []
-        self.eachCategoriesNum = {}
-        self.eachCategoriesBbox = {}
-        self.eachCategoryImageNum = {}
-        self.eachImageCategoryNum = {}
-        self.eachImageBboxNum_list = []
-        self.sizeBboxNum = dict.fromkeys(['small', 'medium', 'large'], 0)
-        self.imagesNum = len(info_data)
-        for info in info_data:
-            w, h = getImageWH(info)
-            self.imagesWH[0].append(w)
-            self.imagesWH[1].append(h)
-            calculatedCategory = []
-            for obj in info['bndbox']:
-                [bboxW, bboxH], anchorRatio, categorie, sizeType = getBboxInfo(info['file'], obj)
-
-                self.calEachCategorieNum(categorie)
-                self.bboxsWH[0].append(bboxW)
-                self.bboxsWH[1].append(bboxH)
-                self.calEachCategorieBbox(categorie, [bboxW, bboxH])
-                if anchorRatio != -1:
-                    self.anchorRatios.append(anchorRatio)
-                if obj['objName'] not in self.eachCategoryImageNum.keys():
-                    self.eachCategoryImageNum[obj['objName']] = 1
-                    calculatedCategory.append(obj['objName'])
-                elif obj['objName'] not in calculatedCategory:
-                    self.eachCategoryImageNum[obj['objName']] += 1
-                    calculatedCategory.append(obj['objName'])
-                if sizeType == 1:
-                    self.sizeBboxNum['small'] += 1
-                elif sizeType == 2:
-                    self.sizeBboxNum['medium'] += 1
-                elif sizeType == 3:
-                    self.sizeBboxNum['large'] += 1
-            if len(calculatedCategory) in self.eachImageCategoryNum:
-                self.eachImageCategoryNum[len(calculatedCategory)] += 1
+    def run(self, type, path, streaming, chunkSize, sampleSize, shard, cache, rebuildCache, readOptions):
+        """
+        read, analyze and output the dataset, see __init__ for the parameters
+        :param readOptions: options of the READERS methods
+        """
+        useCache = cache and type in READERS and READERS[type].cached
+        annotationCache = AnnotationCache(os.path.join(self.outPath, 'cache.sqlite'), rebuildCache) if useCache else None
+        try:
+            if type == 'merge':
+                with stage('merge', len(path)):
+                    self.statistics = Statistics.mergeFiles(path)
+                self.output()
+            elif type in READERS:
+                reader = READERS[type]
+                if streaming:
+                    self.accumulateInfo(reader.chunks(path, chunkSize, cache=annotationCache, shard=shard, **readOptions),
+                                        sampleSize)
+                else:
+                    with stage('read') as record:
+                        table = reader.table(path, cache=annotationCache, shard=shard, **readOptions)
+                        record['items'] = table.imagesNum
+                    self.analyzeInfo(table)
+                self.output(shard)
             else:
-                self.eachImageCategoryNum[len(calculatedCategory)] = 1
-            self.eachImageBboxNum_list.append(len(info['bndbox']))
-        self.bboxNum = len(self.anchorRatios)
+                print(f'Currently only {", ".join(READERS)} formats are supported, please check if the first parameter is correct.')
+        finally:
+            if annotationCache is not None:
+                annotationCache.close()
+
+    def analyzeInfo(self, table):
+        """
+        compute every statistic from an AnnotationTable
+        :param table: AnnotationTable
+        """
+        with stage('analyze', table.bboxNum):
+            self.statistics = Statistics.fromTable(table, self.overlapOptions)
+            self.validate(table)
+
+    def accumulateInfo(self, chunks, sampleSize=100000):
+        """
+        compute every statistic chunk by chunk with bounded memory
+        :param chunks: iterable of AnnotationTable, each holding complete images
+        :param sampleSize: number of W & H points kept for scatters and tables
+        """
+        with stage('accumulate') as record:
+            accumulator = StatisticsAccumulator(sampleSize=sampleSize, overlap=self.overlapOptions)
+            for table in chunks:
+                accumulator.add(table)
+                self.validate(table)
+            self.statistics = accumulator.result()
+            record['items'] = self.statistics.bboxNum
+
+    def validate(self, table):
+        """
+        collect the annotation issues of an AnnotationTable when validation is enabled
+        :param table: AnnotationTable
+        """
+        if self.validateOptions is not None:
+            with stage('validate', table.imagesNum):
+                self.issues.extend(validateTable(table, **self.validateOptions))
+
+    def writeIssues(self, shard=None):
+        """
+        write the collected issues to outPath/issues.json, or issues-i-of-N.json for a shard
+        """
+        name = 'issues.json' if shard is None else f'issues-{shard[0]}-of-{shard[1]}.json'
+        summary = writeIssues(self.issues, os.path.join(self.outPath, name))
+        print(f'{len(self.issues)} annotation issues written to {os.path.join(self.outPath, name)}', summary or '')
+
+    def output(self, shard=None):
+        """
+        print the summary and export images and tables
+        :param shard: (index, count), write the partial statistics of this shard instead
+        """
+        stats = self.statistics
+        if self.statsOnly:
+            # the shard statistics are returned instead of saved
+            shard = None
+            if self.validateOptions is not None:
+                print(f'{len(self.issues)} annotation issues found.')
+        elif self.validateOptions is not None:
+            self.writeIssues(shard)
+        if shard is not None:
+            partialFile = os.path.join(self.outPath, f'partial-{shard[0]}-of-{shard[1]}.npz')
+            with stage('save', stats.imagesNum):
+                stats.save(partialFile, shard)
+            print(f'Partial statistics of shard {shard[0]}/{shard[1]} written to {partialFile}.')
+            return
 
-    def output(self):
         print('\n***************** Info *****************\n')
-        print('number of images: %d' % self.imagesNum)
-        print('number of boxes: %d' % len(self.anchorRatios))
-        className_list = set(self.eachCategoriesNum.keys())
+        print('number of images: %d' % stats.imagesNum)
+        print('number of boxes: %d' % stats.bboxNum)
+        className_list = set(stats.eachCategoriesNum.keys())
         print('classes = ', list(className_list))
+        if self.anchorOptions['k']:
+            with stage('anchors', len(stats.bboxsWH[0])):
+                stats.anchors = clusterAnchors(stats.bboxsWH, **self.anchorOptions)
+            if stats.anchors is None:
+                valid = np.count_nonzero((np.asarray(stats.bboxsWH[0]) > 0) & (np.asarray(stats.bboxsWH[1]) > 0))
+                print(f'No anchors clustered: {self.anchorOptions["k"]} anchors need at least as many boxes with '
+                      f'positive W and H, only {valid} found.')
+        if stats.anchors is not None:
+            print('anchors (W, H) = ', [tuple(round(v, 1) for v in a) for a in stats.anchors['anchors'].tolist()])
+            print('anchor mean IoU: %.4f, recall@%.2f: %.4f' % (stats.anchors['meanIoU'],
+                                                                stats.anchors['recallThreshold'], stats.anchors['recall']))
+        if stats.overlapMaxIoUNum:
+            sameCategory = sum(d[1] == d[2] for d in stats.duplicates)
+            print('duplicate boxes: %d pairs of the same category, %d pairs of different categories'
+                  % (sameCategory, len(stats.duplicates) - sameCategory))
+        if stats.bboxWHGrid is not None:
+            sampled = 'W & H scatters, tables and anchor metrics' if stats.anchors is not None else 'W & H scatters and tables'
+            print(f'{sampled} use a sample of {len(stats.bboxsWH[0])} boxes.')
         print('\n***************** Info *****************\n')
+        if self.statsOnly:
+            return
+
+        # imported here so that stats-only runs never load matplotlib or openpyxl
+        from utils.draw import Draw
+        from utils.excel import Excel
 
         print('Exporting images, please wait...')
-        draw = Draw(self.outPath)
-        draw.drawEachCategoryBboxWH(self.eachCategoriesBbox)
-        draw.drawImageWHScatter(self.imagesWH)
-        draw.drawBboxWHScatter(self.bboxsWH)
-        draw.drawSizeBboxNum(self.sizeBboxNum)
-        draw.drawAnchorRatioBar(self.anchorRatios)
-        draw.drawEachCategoryImagesNum(self.eachCategoryImageNum)
-        draw.drawEachCategoryNum(self.eachCategoriesNum)
-        draw.drawEachImageBboxNum(self.eachImageBboxNum_list)
+        with stage('draw'):
+            draw = Draw(self.outPath, **self.drawOptions)
+            draw.drawStatistics(stats)
+            draw.close()
         print('Export images completed.')
 
         print('Exporting Excel table, please wait...')
-        excel = Excel(self.outPath)
-        excel.imageWH(self.imagesWH)
-        excel.bboxWH(self.bboxsWH)
-        excel.anchorRatio(self.anchorRatios)
-        excel.eachCategory(self.eachCategoriesNum)
-        excel.eachCategoryImagesNum(self.eachCategoryImageNum)
-        excel.eachImageBboxNum(self.eachImageBboxNum_list)
-        excel.sizeBboxNum(self.sizeBboxNum)
-        excel.eachCategoryBboxWH(self.eachCategoriesBbox)
+        with stage('excel'):
+            excel = Excel(self.outPath, **self.exportOptions)
+            excel.exportStatistics(stats)
+            excel.close()
         print('Export Excel table completed.')
 
 
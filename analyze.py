@@ -1,19 +1,105 @@
 import argparse
+import zipfile
 from DataAnalyze import DataAnalyze
+from utils.statistics import Statistics
+
+def parse_shard(value):
+    try:
+        index, count = (int(v) for v in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like 'i/N', got '{value}'")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f'shard index must be in [0, {count}), got {index}')
+    return index, count
 
 def parse_args():
     parser = argparse.ArgumentParser(description='dataset analyze')
-    parser.add_argument('type', type=str, help="Dataset format, optional 'voc' and 'coco'")
-    parser.add_argument('path', type=str, help='Dataset path, if it is a voc dataset, it corresponds '
+    parser.add_argument('type', type=str, help="Dataset format, optional 'voc', 'coco', 'yolo' and 'csv', "
+                                               "or 'merge' to combine the partial statistics of shards")
+    parser.add_argument('path', type=str, nargs='+', help='Dataset path, if it is a voc dataset, it corresponds '
                                                'to the xml directory, if it is a coco dataset, it is the json file '
-                                               'path')
+                                               'path, for yolo the label directory, for csv the csv file, '
+                                               'for merge it is the partial statistics files of every shard')
     parser.add_argument('--out', type=str, default='out', help='Result output directory')
-    return parser.parse_args()
+    parser.add_argument('--stream-json', action='store_true', help='Parse the coco json file incrementally (requires ijson), '
+                                                                   'for json files larger than memory, implied by --streaming')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used to parse voc xml files')
+    parser.add_argument('--no-cache', action='store_true', help='Do not use the parsed annotation cache in the output directory')
+    parser.add_argument('--rebuild-cache', action='store_true', help='Drop the parsed annotation cache and parse every file again')
+    parser.add_argument('--density-threshold', type=int, default=100000, help='Scatter plots with more points than '
+                                                                             'this are drawn as a 2D histogram')
+    parser.add_argument('--density-bins', type=int, default=256, help='Number of bins on each axis of the 2D histogram')
+    parser.add_argument('--density-linear', action='store_true', help='Linear instead of log color scale for the 2D histogram')
+    parser.add_argument('--plot-workers', type=int, default=1, help='Number of processes rendering figures')
+    parser.add_argument('--no-category-plots', action='store_true', help='Skip the per-category bbox W & H scatters')
+    parser.add_argument('--raw-format', type=str, default='xlsx', choices=['xlsx', 'workbook', 'csv', 'parquet'],
+                        help='Export format of the image and bbox W & H tables')
+    parser.add_argument('--summary-format', type=str, default='xlsx', choices=['xlsx', 'workbook', 'csv', 'parquet'],
+                        help='Export format of the count tables')
+    parser.add_argument('--streaming', action='store_true', help='Fold images into the statistics chunk by chunk with '
+                                                                 'bounded memory, W & H scatters and tables use a sample')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Number of images per chunk in streaming mode')
+    parser.add_argument('--sample-size', type=int, default=100000, help='Number of W & H points kept in streaming mode')
+    parser.add_argument('--shard', type=parse_shard, default=None, help="Only analyze shard i of N ('i/N', 0 <= i < N) "
+                                                                        'and write its partial statistics to the output directory')
+    parser.add_argument('--anchors', type=int, default=0, help='Number of anchors to cluster from the bbox W & H with '
+                                                               'IoU k-means, default 0 skips clustering')
+    parser.add_argument('--anchor-restarts', type=int, default=10, help='Number of k-means runs, the best one is kept')
+    parser.add_argument('--anchor-workers', type=int, default=1, help='Number of processes running k-means restarts')
+    parser.add_argument('--anchor-sample-size', type=int, default=100000, help='Number of boxes k-means runs on, '
+                                                                               '0 uses every box')
+    parser.add_argument('--overlap', action='store_true', help='Analyze the overlaps between the boxes of each image '
+                                                               'and report duplicate boxes')
+    parser.add_argument('--overlap-iou', type=float, default=0.5, help='IoU from which a box counts as overlapping '
+                                                                       'another one in the per-category counts')
+    parser.add_argument('--duplicate-iou', type=float, default=0.9, help='IoU from which a pair of boxes is reported '
+                                                                         'as duplicate')
+    parser.add_argument('--validate', action='store_true', help='Check annotated image sizes and box bounds and write '
+                                                                'the issues to issues.json in the output directory')
+    parser.add_argument('--images', type=str, default=None, help='Image directory, with --validate the annotated sizes '
+                                                                 'are compared with the image headers. yolo reads the '
+                                                                 "image sizes from it, by default the label directory "
+                                                                 "with 'labels' replaced by 'images'")
+    parser.add_argument('--names', type=str, default=None, help='Category names file of yolo labels, one name per line, '
+                                                                'by default classes.txt next to the labels')
+    parser.add_argument('--validate-workers', type=int, default=8, help='Number of threads reading image headers')
+    parser.add_argument('--stats-only', action='store_true', help='Only print the statistics, no figure, table or '
+                                                                  'file is written and matplotlib is not loaded')
+    parser.add_argument('--profile', action='store_true', help='Print the wall time, CPU time, peak RSS and item count '
+                                                               'of every stage, figure and table')
+    parser.add_argument('--profile-json', type=str, default=None, help='Also write the profile to this json file')
+    parser.add_argument('--cprofile', type=str, default=None, help="Run this stage, e.g. 'analyze' or 'draw', under "
+                                                                   'cProfile and write its stats to the output directory')
+    args = parser.parse_args()
+    if args.type != 'merge' and len(args.path) != 1:
+        parser.error(f'{args.type} takes a single dataset path')
+    if args.shard is not None and (args.streaming or args.type == 'merge'):
+        parser.error('--shard cannot be combined with --streaming or merge')
+    if args.validate and args.type == 'merge':
+        parser.error('--validate needs the annotations, run it on the shards instead of merge')
+    if args.type == 'merge':
+        try:
+            Statistics.checkShards([Statistics.loadShard(p) for p in args.path])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            parser.error(f'cannot merge {" ".join(args.path)}: {e}')
+    return args
 
 
 def main():
     args = parse_args()
-    DataAnalyze(args.type, args.path, args.out)
+    path = args.path if args.type == 'merge' else args.path[0]
+    DataAnalyze(args.type, path, args.out, streamJson=args.stream_json, workers=args.workers,
+                cache=not args.no_cache, rebuildCache=args.rebuild_cache,
+                densityThreshold=args.density_threshold, densityBins=args.density_bins,
+                densityLog=not args.density_linear, plotWorkers=args.plot_workers,
+                categoryPlots=not args.no_category_plots, rawFormat=args.raw_format,
+                summaryFormat=args.summary_format, streaming=args.streaming, chunkSize=args.chunk_size,
+                sampleSize=args.sample_size, shard=args.shard, anchorNum=args.anchors,
+                anchorRestarts=args.anchor_restarts, anchorWorkers=args.anchor_workers,
+                anchorSampleSize=args.anchor_sample_size, overlap=args.overlap,
+                overlapIoU=args.overlap_iou, duplicateIoU=args.duplicate_iou, validate=args.validate,
+                imageDir=args.images, validateWorkers=args.validate_workers, profile=args.profile,
+                profileFile=args.profile_json, cprofileStage=args.cprofile, statsOnly=args.stats_only, names=args.names)
 
 
 if __name__ == '__main__':
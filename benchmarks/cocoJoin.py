@@ -0,0 +1,61 @@
+"""
+compare the per-image annotation scan cocoVisualize used to do with the image -> boxes index
+of AnnotationTable, on a synthetic coco json file. images are not decoded, only the join is timed.
+
+python benchmarks/cocoJoin.py --images 5000 --boxes 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import syntheticAnnotations, writeCoco
+from utils.read import readCoco
+
+
+def scanJoin(jsonFile):
+    with open(jsonFile) as f:
+        annotation_json = json.load(f)
+    drawn = 0
+    for img in annotation_json['images']:
+        for annotation in annotation_json['annotations']:
+            if annotation['image_id'] == img['id']:
+                x, y, w, h = annotation['bbox']
+                drawn += 1
+    return drawn
+
+
+def indexJoin(jsonFile):
+    table = readCoco(jsonFile)
+    boxes = table.boxes().astype(int)
+    offsets = table.imageOffsets()
+    drawn = 0
+    for i in range(table.imagesNum):
+        for x1, y1, x2, y2 in boxes[offsets[i]:offsets[i + 1]]:
+            drawn += 1
+    return drawn
+
+
+def main():
+    parser = argparse.ArgumentParser(description='coco image/annotation join benchmark')
+    parser.add_argument('--images', type=int, default=2000, help='Number of synthetic images')
+    parser.add_argument('--boxes', type=int, default=8, help='Boxes per image')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonFile = os.path.join(tmp, 'synthetic.json')
+        writeCoco(syntheticAnnotations(args.images, args.boxes), jsonFile)
+        results = {}
+        for name, join in [('scan', scanJoin), ('index', indexJoin)]:
+            start = time.perf_counter()
+            drawn = join(jsonFile)
+            results[name] = time.perf_counter() - start
+            print(f'{name:>6}: {results[name]:.3f}s, {drawn} boxes')
+        print(f'speedup: {results["scan"] / results["index"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+time and memory-profile every stage of the analysis on synthetic datasets of several sizes,
+results are written to a json file that a later run can be compared with
+
+python benchmarks/stages.py --scales 1000 10000 --out results.json
+python benchmarks/stages.py --scales 1000 10000 --out new.json --compare results.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+from benchmarks.synthetic import writeDataset
+from utils.draw import Draw
+from utils.excel import Excel
+from utils.read import readCoco, readVoc
+from utils.statistics import Statistics
+
+
+def stages(dataset, outPath, args):
+    """
+    :return: list of (name, function returning the number of items it processed), run in order,
+             later stages use the results of earlier ones through the shared state dict
+    """
+    state = {}
+
+    def readCocoStage():
+        state['table'] = readCoco(dataset['json'])
+        return state['table'].bboxNum
+
+    def readCocoStreamStage():
+        return readCoco(dataset['json'], stream=True).bboxNum
+
+    def readVocStage():
+        return readVoc(dataset['xml'], workers=args.workers).bboxNum
+
+    def analyzeStage():
+        state['stats'] = Statistics.fromTable(state['table'])
+        return state['stats'].bboxNum
+
+    def drawStage():
+        draw = Draw(outPath, workers=args.workers)
+        draw.drawStatistics(state['stats'])
+        draw.close()
+        return len(glob.glob(os.path.join(outPath, 'img', '**', '*.png'), recursive=True))
+
+    def excelStage():
+        excel = Excel(outPath, rawFormat=args.format, summaryFormat=args.format)
+        excel.exportStatistics(state['stats'])
+        excel.close()
+        return sum(len(files) for _, _, files in os.walk(os.path.join(outPath, 'excel')))
+
+    def visualizeStage():
+        from visualize import DataVisualization
+        out = os.path.join(outPath, 'visualize')
+        DataVisualization('coco', dataset['images'], dataset['json'], out, 1, workers=args.workers)
+        return len(os.listdir(out))
+
+    result = [('readCoco', readCocoStage)]
+    if not args.no_stream:
+        result.append(('readCocoStream', readCocoStreamStage))
+    result += [('readVoc', readVocStage), ('analyze', analyzeStage), ('draw', drawStage), ('excel', excelStage)]
+    if dataset['images'] is not None:
+        result.append(('visualize', visualizeStage))
+    return result
+
+def measure(fn, memory):
+    """
+    :param fn: stage function
+    :param memory: trace Python allocations (numpy arrays included) to get the peak memory, slows fn down.
+                   only this process is traced, work done by worker processes is not counted
+    :return: {'seconds', 'cpuSeconds', 'items'} plus 'peakMB' when memory is True
+    """
+    if memory:
+        tracemalloc.start()
+    start, cpuStart = time.perf_counter(), time.process_time()
+    items = fn()
+    result = {'seconds': time.perf_counter() - start, 'cpuSeconds': time.process_time() - cpuStart, 'items': items}
+    if memory:
+        result['peakMB'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result
+
+def runScale(imagesNum, args, workPath):
+    """
+    generate a dataset of imagesNum images and run every stage on it, once timed and once traced
+    :return: list of results, one per stage
+    """
+    datasetPath = os.path.join(workPath, f'dataset-{imagesNum}')
+    dataset = writeDataset(datasetPath, imagesNum, args.boxes, args.classes, args.segmentation,
+                           tuple(args.image_size), not args.no_images)
+    results = []
+    runs = [False, True] if args.memory else [False]
+    for run, memory in enumerate(runs):
+        outPath = os.path.join(workPath, f'out-{imagesNum}-{run}')
+        os.makedirs(outPath)
+        for i, (name, fn) in enumerate(stages(dataset, outPath, args)):
+            measured = measure(fn, memory)
+            if run == 0:
+                results.append({'images': imagesNum, 'boxes': imagesNum * args.boxes, 'stage': name, **measured})
+                print(f'{imagesNum:>9} {name:>15} {measured["seconds"]:9.3f}s {measured["items"]:>10} items')
+            else:
+                results[i]['peakMB'] = measured['peakMB']
+        shutil.rmtree(outPath)
+    shutil.rmtree(datasetPath)
+    return results
+
+def compare(results, baseline):
+    """
+    print the time and memory of every (images, stage) relative to a previous run
+    """
+    old = {(r['images'], r['stage']): r for r in baseline['results']}
+    print(f'\n{"images":>9} {"stage":>15} {"old":>9} {"new":>9} {"ratio":>7} {"peak MB ratio":>14}')
+    for r in results:
+        o = old.get((r['images'], r['stage']))
+        if o is None:
+            continue
+        memory = f'{r["peakMB"] / o["peakMB"]:14.2f}' if 'peakMB' in r and o.get('peakMB') else f'{"-":>14}'
+        print(f'{r["images"]:>9} {r["stage"]:>15} {o["seconds"]:8.3f}s {r["seconds"]:8.3f}s '
+              f'{r["seconds"] / max(o["seconds"], 1e-9):7.2f} {memory}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark every analysis stage on synthetic datasets')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000], help='Numbers of images')
+    parser.add_argument('--boxes', type=int, default=8, help='Mean number of boxes per image')
+    parser.add_argument('--classes', type=int, default=10, help='Number of categories')
+    parser.add_argument('--segmentation', type=int, default=0, help='Polygon points of each coco annotation')
+    parser.add_argument('--image-size', type=int, nargs=2, default=[64, 48], help='Base W H of the images')
+    parser.add_argument('--no-images', action='store_true', help='Skip the images and the visualize stage')
+    parser.add_argument('--no-stream', action='store_true', help='Skip the streaming coco reader (requires ijson)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='Skip the traced run measuring peak memory')
+    parser.add_argument('--workers', type=int, default=1, help='Processes of the voc reader, draw and visualize')
+    parser.add_argument('--format', type=str, default='xlsx', choices=['xlsx', 'workbook', 'csv', 'parquet'],
+                        help='Export format of the excel stage')
+    parser.add_argument('--work-dir', type=str, default=None, help='Directory for the datasets and outputs, '
+                                                                   'a temporary directory by default')
+    parser.add_argument('--out', type=str, default='benchmark.json', help='Result json file')
+    parser.add_argument('--compare', type=str, default=None, help='Result json file of a previous run to compare with')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as workPath:
+        for imagesNum in args.scales:
+            results += runScale(imagesNum, args, workPath)
+
+    meta = {'date': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'args': vars(args)}
+    with open(args.out, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=1)
+    print(f'Results written to {args.out}.')
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
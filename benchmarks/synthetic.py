@@ -0,0 +1,141 @@
+"""
+synthetic coco / voc datasets of any size, with small images, for benchmarks
+
+python benchmarks/synthetic.py out --images 10000 --boxes 8 --classes 20 --segmentation 16
+"""
+import argparse
+import io
+import json
+import os
+
+import numpy as np
+
+
+def syntheticAnnotations(imagesNum, boxesPerImage, categoriesNum=10, imageSize=(64, 48), seed=0):
+    """
+    random images and boxes, every box lies inside its image
+    :param imagesNum: number of images
+    :param boxesPerImage: mean number of boxes per image, boxes are spread over images at random
+    :param categoriesNum: number of categories
+    :param imageSize: base (W, H) of the images, each image is this size, rotated or 1.25 times larger
+    :param seed: random seed
+    :return: {'filenames', 'imagesW', 'imagesH', 'categories', 'imageIds', 'categoryIds', 'x', 'y', 'w', 'h'}
+    """
+    rng = np.random.default_rng(seed)
+    W, H = imageSize
+    sizes = np.array([[W, H], [H, W], [W * 5 // 4, H * 5 // 4]])[rng.integers(3, size=imagesNum)]
+    boxesNum = imagesNum * boxesPerImage
+    imageIds = np.sort(rng.integers(imagesNum, size=boxesNum))
+    imageW, imageH = sizes[imageIds, 0], sizes[imageIds, 1]
+    w = np.round(rng.uniform(1, imageW / 2), 1)
+    h = np.round(rng.uniform(1, imageH / 2), 1)
+    return {'filenames': [f'{i:08d}.jpg' for i in range(imagesNum)],
+            'imagesW': sizes[:, 0], 'imagesH': sizes[:, 1],
+            'categories': [f'class{i}' for i in range(categoriesNum)],
+            'imageIds': imageIds, 'categoryIds': rng.integers(categoriesNum, size=boxesNum),
+            'x': np.round(rng.uniform(0, imageW - w), 1), 'y': np.round(rng.uniform(0, imageH - h), 1), 'w': w, 'h': h}
+
+def polygon(x, y, w, h, points):
+    """
+    :return: coco segmentation of an ellipse inscribed in the box, with this many points
+    """
+    angles = np.linspace(0, 2 * np.pi, points, endpoint=False)
+    xs = x + w / 2 * (1 + np.cos(angles))
+    ys = y + h / 2 * (1 + np.sin(angles))
+    return [np.round(np.stack([xs, ys], axis=1).ravel(), 1).tolist()]
+
+def writeCoco(data, jsonFile, segmentation=0):
+    """
+    :param data: result of syntheticAnnotations
+    :param jsonFile: coco json file path
+    :param segmentation: number of polygon points of each annotation, 0 for no segmentation
+    """
+    images = [{'id': i, 'file_name': f, 'width': int(w), 'height': int(h)}
+              for i, (f, w, h) in enumerate(zip(data['filenames'], data['imagesW'], data['imagesH']))]
+    annotations = []
+    for i, (image, category, x, y, w, h) in enumerate(zip(data['imageIds'].tolist(), data['categoryIds'].tolist(),
+                                                          data['x'].tolist(), data['y'].tolist(),
+                                                          data['w'].tolist(), data['h'].tolist())):
+        annotation = {'id': i, 'image_id': image, 'category_id': category, 'bbox': [x, y, w, h],
+                      'area': round(w * h, 2), 'iscrowd': 0}
+        if segmentation:
+            annotation['segmentation'] = polygon(x, y, w, h, segmentation)
+        annotations.append(annotation)
+    categories = [{'id': i, 'name': name} for i, name in enumerate(data['categories'])]
+    with open(jsonFile, 'w') as f:
+        json.dump({'images': images, 'annotations': annotations, 'categories': categories}, f)
+
+def writeVoc(data, xmlDir):
+    """
+    :param data: result of syntheticAnnotations
+    :param xmlDir: directory of the voc xml files, one per image
+    """
+    os.makedirs(xmlDir, exist_ok=True)
+    offsets = np.searchsorted(data['imageIds'], np.arange(len(data['filenames']) + 1))
+    x1, y1 = data['x'], data['y']
+    x2, y2 = x1 + data['w'], y1 + data['h']
+    for i, filename in enumerate(data['filenames']):
+        objects = ''.join(
+            f'<object><name>{data["categories"][c]}</name><difficult>0</difficult>'
+            f'<bndbox><xmin>{a:.1f}</xmin><ymin>{b:.1f}</ymin><xmax>{c2:.1f}</xmax><ymax>{d:.1f}</ymax></bndbox></object>'
+            for c, a, b, c2, d in zip(data['categoryIds'][offsets[i]:offsets[i + 1]].tolist(),
+                                      x1[offsets[i]:offsets[i + 1]].tolist(), y1[offsets[i]:offsets[i + 1]].tolist(),
+                                      x2[offsets[i]:offsets[i + 1]].tolist(), y2[offsets[i]:offsets[i + 1]].tolist()))
+        with open(os.path.join(xmlDir, f'{os.path.splitext(filename)[0]}.xml'), 'w') as f:
+            f.write(f'<annotation><filename>{filename}</filename><size><width>{data["imagesW"][i]}</width>'
+                    f'<height>{data["imagesH"][i]}</height><depth>3</depth></size>{objects}</annotation>')
+
+def writeImages(data, imageDir, seed=0):
+    """
+    write a noise jpeg for every image, each distinct size is encoded once
+    :param data: result of syntheticAnnotations
+    :param imageDir: image directory
+    """
+    from PIL import Image
+    os.makedirs(imageDir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    encoded = {}
+    for filename, w, h in zip(data['filenames'], data['imagesW'].tolist(), data['imagesH'].tolist()):
+        if (w, h) not in encoded:
+            buffer = io.BytesIO()
+            Image.fromarray(rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+            encoded[w, h] = buffer.getvalue()
+        with open(os.path.join(imageDir, filename), 'wb') as f:
+            f.write(encoded[w, h])
+
+def writeDataset(outPath, imagesNum, boxesPerImage, categoriesNum=10, segmentation=0, imageSize=(64, 48),
+                 images=True, seed=0):
+    """
+    write outPath/annotations.json, outPath/xml and outPath/images for the same synthetic annotations
+    :return: {'json', 'xml', 'images'} paths, 'images' is None when images is False
+    """
+    data = syntheticAnnotations(imagesNum, boxesPerImage, categoriesNum, imageSize, seed)
+    paths = {'json': os.path.join(outPath, 'annotations.json'), 'xml': os.path.join(outPath, 'xml'),
+             'images': os.path.join(outPath, 'images') if images else None}
+    os.makedirs(outPath, exist_ok=True)
+    writeCoco(data, paths['json'], segmentation)
+    writeVoc(data, paths['xml'])
+    if images:
+        writeImages(data, paths['images'], seed)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='synthetic coco / voc dataset')
+    parser.add_argument('out', type=str, help='Output directory')
+    parser.add_argument('--images', type=int, default=1000, help='Number of images')
+    parser.add_argument('--boxes', type=int, default=8, help='Mean number of boxes per image')
+    parser.add_argument('--classes', type=int, default=10, help='Number of categories')
+    parser.add_argument('--segmentation', type=int, default=0, help='Polygon points of each coco annotation, '
+                                                                    '0 for no segmentation')
+    parser.add_argument('--image-size', type=int, nargs=2, default=[64, 48], help='Base W H of the images')
+    parser.add_argument('--no-images', action='store_true', help='Only write the annotations')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+    paths = writeDataset(args.out, args.images, args.boxes, args.classes, args.segmentation,
+                         tuple(args.image_size), not args.no_images, args.seed)
+    print(paths)
+
+
+if __name__ == '__main__':
+    main()
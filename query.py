@@ -0,0 +1,66 @@
+import argparse
+import os
+import time
+from utils.index import SIZE_NAMES, DatasetIndex
+from utils.read import READERS
+from utils.write import writeCoco, writeList, writeVoc
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='dataset query')
+    parser.add_argument('type', type=str, help="Dataset format, optional 'voc', 'coco', 'yolo' and 'csv', "
+                                               "or 'index' to load an index written by --save-index")
+    parser.add_argument('path', type=str, help='Dataset path, as for analyze.py, or the index file')
+    parser.add_argument('--images', type=str, default=None, help='Image directory of yolo labels')
+    parser.add_argument('--names', type=str, default=None, help='Category names file of yolo labels')
+    parser.add_argument('--stream-json', action='store_true', help='Parse the coco json file incrementally (requires ijson)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used to parse voc xml files')
+    parser.add_argument('--save-index', type=str, default=None, help='Write the dataset and its indexes to this npz '
+                                                                     "file, query it later with type 'index'")
+    parser.add_argument('--category', type=str, nargs='+', default=None, help='Images with a box of one of these categories')
+    parser.add_argument('--size', type=str, nargs='+', default=None, choices=SIZE_NAMES, help='Images with a box of one of these sizes')
+    parser.add_argument('--min-ratio', type=float, default=None, help='Images with a box of at least this anchor ratio')
+    parser.add_argument('--max-ratio', type=float, default=None, help='Images with a box of at most this anchor ratio')
+    parser.add_argument('--min-boxes', type=int, default=None, help='Images with at least this many boxes')
+    parser.add_argument('--max-boxes', type=int, default=None, help='Images with at most this many boxes')
+    parser.add_argument('--list', type=str, default=None, help='Write the matching image file names to this file, '
+                                                               'they are printed when no output is given')
+    parser.add_argument('--coco', type=str, default=None, help='Write the matching images as a coco json file')
+    parser.add_argument('--voc', type=str, default=None, help='Write the matching images as a voc xml directory')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.type == 'index':
+        index = DatasetIndex.load(args.path)
+    else:
+        table = READERS[args.type].table(args.path, stream=args.stream_json, workers=args.workers,
+                                         imageDir=args.images, names=args.names)
+        index = DatasetIndex(table, source=(args.type, os.path.abspath(args.path)))
+    if args.save_index is not None:
+        index.save(args.save_index)
+        print(f'Index written to {args.save_index}.')
+
+    start = time.perf_counter()
+    try:
+        images = index.query(categories=args.category, sizes=args.size, minRatio=args.min_ratio,
+                             maxRatio=args.max_ratio, minBoxes=args.min_boxes, maxBoxes=args.max_boxes)
+    except ValueError as e:
+        print(e)
+        return
+    subset = index.subset(images)
+    print(f'{subset.imagesNum} of {index.table.imagesNum} images match ({time.perf_counter() - start:.3f}s).')
+
+    if args.list is not None:
+        writeList(subset, args.list)
+    if args.coco is not None:
+        source = index.source
+        writeCoco(subset, args.coco, source=source[1] if source is not None and source[0] == 'coco' else None)
+    if args.voc is not None:
+        writeVoc(subset, args.voc)
+    if args.list is None and args.coco is None and args.voc is None and args.save_index is None:
+        for filename in subset.filenames:
+            print(filename)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def whIoU(wh, anchors):
+    """
+    IoU of boxes and anchors aligned at the same corner, i.e. only their W & H matter
+    :param wh: (n, 2) box W & H
+    :param anchors: (k, 2) anchor W & H
+    :return: (n, k) IoU
+    """
+    inter = np.minimum(wh[:, None, 0], anchors[None, :, 0]) * np.minimum(wh[:, None, 1], anchors[None, :, 1])
+    union = (wh[:, 0] * wh[:, 1])[:, None] + (anchors[:, 0] * anchors[:, 1])[None, :] - inter
+    return inter / union
+
+def bestIoU(wh, anchors, chunkSize=1000000):
+    """
+    :return: index of the best anchor and its IoU for every box, computed in chunks to bound memory
+    """
+    best = np.empty(len(wh), dtype=np.int64)
+    iou = np.empty(len(wh))
+    for start in range(0, len(wh), chunkSize):
+        ious = whIoU(wh[start:start + chunkSize], anchors)
+        best[start:start + chunkSize] = ious.argmax(axis=1)
+        iou[start:start + chunkSize] = ious.max(axis=1)
+    return best, iou
+
+def initAnchors(wh, k, rng):
+    """
+    k-means++ initialization with 1 - IoU as distance
+    """
+    anchors = wh[[rng.integers(len(wh))]]
+    distance = 1 - whIoU(wh, anchors)[:, 0]
+    for _ in range(1, k):
+        weights = distance ** 2
+        total = weights.sum()
+        i = rng.choice(len(wh), p=weights / total) if total > 0 else rng.integers(len(wh))
+        anchors = np.concatenate([anchors, wh[[i]]])
+        distance = np.minimum(distance, 1 - whIoU(wh, wh[[i]])[:, 0])
+    return anchors
+
+def kmeansAnchors(wh, k, seed, maxIter=300):
+    """
+    one k-means run with 1 - IoU as distance and the median W & H of each cluster as its center
+    :param wh: (n, 2) box W & H
+    :param k: number of anchors
+    :param seed: seed of this run
+    :param maxIter: maximum number of iterations
+    :return: anchors (k, 2), mean best IoU
+    """
+    rng = np.random.default_rng(seed)
+    anchors = initAnchors(wh, k, rng)
+    assign = None
+    for _ in range(maxIter):
+        newAssign, _ = bestIoU(wh, anchors)
+        if assign is not None and np.array_equal(newAssign, assign):
+            break
+        assign = newAssign
+        for c in range(k):
+            members = wh[assign == c]
+            if len(members):
+                anchors[c] = np.median(members, axis=0)
+    _, iou = bestIoU(wh, anchors)
+    return anchors, iou.mean()
+
+def clusterAnchors(bboxsWH, k=9, restarts=10, workers=1, sampleSize=100000, recallThreshold=0.5, seed=0):
+    """
+    cluster bbox W & H into anchors with IoU k-means, keeping the best of several restarts
+    :param bboxsWH: [w, h] of every box
+    :param k: number of anchors
+    :param restarts: number of k-means runs with different k-means++ initializations
+    :param workers: number of processes running restarts concurrently
+    :param sampleSize: cluster a random sample of this many boxes, None or 0 to use every box
+    :param recallThreshold: IoU a box needs with its best anchor to count as recalled
+    :param seed: random seed
+    :return: {'anchors': (k, 2) sorted by area, 'num': boxes per anchor, 'clusterIoU': mean IoU per anchor,
+              'meanIoU': mean best IoU, 'recall': fraction of boxes recalled, 'recallThreshold': recallThreshold}
+              None if there are fewer than k valid boxes
+    """
+    wh = np.stack([np.asarray(bboxsWH[0], dtype=np.float64), np.asarray(bboxsWH[1], dtype=np.float64)], axis=1)
+    wh = wh[(wh[:, 0] > 0) & (wh[:, 1] > 0)]
+    if len(wh) < k:
+        return None
+
+    seeds = np.random.SeedSequence(seed).spawn(restarts + 1)
+    sample = wh
+    if sampleSize and len(wh) > sampleSize:
+        sample = wh[np.random.default_rng(seeds[0]).choice(len(wh), sampleSize, replace=False)]
+
+    runs = [(sample, k, s) for s in seeds[1:]]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(kmeansAnchors, *zip(*runs)))
+    else:
+        results = [kmeansAnchors(*run) for run in runs]
+    anchors, _ = max(results, key=lambda r: r[1])
+    anchors = anchors[np.argsort(anchors[:, 0] * anchors[:, 1])]
+
+    # evaluate on every box, not only the sample
+    assign, iou = bestIoU(wh, anchors)
+    num = np.bincount(assign, minlength=k)
+    clusterIoU = np.bincount(assign, weights=iou, minlength=k) / np.maximum(num, 1)
+    return {'anchors': anchors, 'num': num, 'clusterIoU': clusterIoU, 'meanIoU': float(iou.mean()),
+            'recall': float((iou >= recallThreshold).mean()), 'recallThreshold': recallThreshold}
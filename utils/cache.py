@@ -0,0 +1,72 @@
+import os
+import pickle
+import sqlite3
+
+
+class AnnotationCache:
+    """
+    on-disk cache of parsed annotation files, keyed by path + mtime + size
+    """
+    def __init__(self, cacheFile, rebuild=False):
+        """
+        :param cacheFile: path of the sqlite cache file
+        :param rebuild: drop every cached entry before use
+        """
+        self.cacheFile = cacheFile
+        self.conn = sqlite3.connect(cacheFile)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS records '
+                          '(path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, data BLOB)')
+        if rebuild:
+            self.conn.execute('DELETE FROM records')
+        self.conn.commit()
+
+    @staticmethod
+    def fileKey(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def fresh(self, paths):
+        """
+        stat every file once and look up all entries with a single query
+        :param paths: annotation file paths
+        :return: {path: file key} of the files with an up to date entry, keys are passed on to get
+        """
+        cached = {(p, m, s) for p, m, s in self.conn.execute('SELECT path, mtime, size FROM records')}
+        keys = ((path, self.fileKey(path)) for path in paths)
+        return {path: fileKey for path, fileKey in keys if fileKey in cached}
+
+    def get(self, path, fileKey=None):
+        """
+        :param path: annotation file path
+        :param fileKey: key of the file from fresh, saves statting the file again
+        :return: cached object, None if missing or the file changed since it was cached
+        """
+        key, mtime, size = fileKey if fileKey is not None else self.fileKey(path)
+        row = self.conn.execute('SELECT data FROM records WHERE path = ? AND mtime = ? AND size = ?',
+                                (key, mtime, size)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, path, obj):
+        """
+        :param path: annotation file path
+        :param obj: parsed object to cache for this file
+        """
+        key, mtime, size = self.fileKey(path)
+        self.conn.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)',
+                          (key, mtime, size, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def prune(self, directory, paths):
+        """
+        remove entries of files under directory that are no longer in paths
+        :param directory: directory the paths were listed from
+        :param paths: annotation files currently in the directory
+        """
+        prefix = os.path.join(os.path.abspath(directory), '')
+        keep = {os.path.abspath(p) for p in paths}
+        cached = self.conn.execute('SELECT path FROM records WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+        deleted = [(p,) for p, in cached.fetchall() if p not in keep]
+        self.conn.executemany('DELETE FROM records WHERE path = ?', deleted)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -1,39 +1,49 @@
-def calculateAnchorRatio(w, h):
-        """
-        calculate anchor ratio
-        :param w: width
-        :param h: height
-        :return: AnchorRatio
-        """
-        r = w / h if w > h else h / w
-        return round(r)
-
-def getImageWH(info):
-        w, h = info['width'], info['height']
-        return [float(w), float(h)]
+import numpy as np
 
-def getBboxInfo(file, obj):
-    w = float(obj['xmax']) - float(obj['xmin'])
-    h = float(obj['ymax']) - float(obj['ymin'])
 
-    # anchorRatio
-    anchorRatio = -1
-    try:
-        anchorRatio = calculateAnchorRatio(w, h)
-    except Exception:
-        print('\n============ Errors ============\n')
-        print(file, 'Image has wrong height and width.')
-        print('\n============ Errors ============\n')
+def calculateAnchorRatio(w, h):
+    """
+    calculate anchor ratio of every box
+    :param w: widths
+    :param h: heights
+    :return: AnchorRatio of every box, -1 where w or h is 0
+    """
+    w = np.asarray(w, dtype=np.float64)
+    h = np.asarray(h, dtype=np.float64)
+    valid = (w != 0) & (h != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where(w > h, w / h, h / w)
+    return np.where(valid, np.round(r), -1)
 
-    # categories
-    categorie = obj['objName']
+def getSizeType(w, h):
+    """
+    coco size type of every box
+    :param w: widths
+    :param h: heights
+    :return: 1 for small, 2 for medium, 3 for large
+    """
+    area = np.asarray(w) * np.asarray(h)
+    return np.digitize(area, [32 * 32, 96 * 96]) + 1
 
-    area = w * h
-    if area < (32 * 32):
-        sizeType = 1
-    elif area < (96 * 96):
-        sizeType = 2
-    else:
-        sizeType = 3
+def firstAppearanceOrder(ids):
+    """
+    distinct values of ids, ordered by where they first appear
+    :param ids: int array
+    :return: int array of distinct ids
+    """
+    unique, first = np.unique(ids, return_index=True)
+    return unique[np.argsort(first, kind='stable')]
 
-    return [w, h], anchorRatio, categorie, sizeType
\ No newline at end of file
+def countValues(values):
+    """
+    histogram of integer values in a single bincount pass
+    :param values: int array
+    :return: {value: count} in ascending value order, only values that occur
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if not len(values):
+        return {}
+    offset = values.min()
+    counts = np.bincount(values - offset)
+    nonzero = np.flatnonzero(counts)
+    return dict(zip((nonzero + offset).tolist(), counts[nonzero].tolist()))
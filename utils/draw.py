@@ -1,30 +1,156 @@
 import os
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+from utils.profiling import add, stage, timed
 
 
+def newFigure():
+    """
+    a figure on the Agg canvas, independent of pyplot's global state so figures can be rendered concurrently
+    :return: figure, axes
+    """
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+def saveFigure(fig, ax, title, xlabel, ylabel, imgPath):
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    fig.savefig(imgPath)
+
+def renderScatter(x, y, title, xlabel, ylabel, imgPath):
+    fig, ax = newFigure()
+    ax.scatter(x, y)
+    saveFigure(fig, ax, title, xlabel, ylabel, imgPath)
+
+def renderDensity(x, y, bins, log, title, xlabel, ylabel, imgPath):
+    counts, xedges, yedges = np.histogram2d(x, y, bins=bins)
+    renderCounts(counts, xedges, yedges, log, title, xlabel, ylabel, imgPath)
+
+def renderCounts(counts, xedges, yedges, log, title, xlabel, ylabel, imgPath):
+    fig, ax = newFigure()
+    counts = np.ma.masked_equal(counts.T, 0)
+    norm = LogNorm(vmin=1, vmax=max(counts.max(), 1)) if log else None
+    mesh = ax.pcolormesh(xedges, yedges, counts, norm=norm, cmap='viridis')
+    fig.colorbar(mesh, ax=ax, label='num')
+    saveFigure(fig, ax, title, xlabel, ylabel, imgPath)
+
+def renderBar(x, y, title, xlabel, ylabel, imgPath):
+    fig, ax = newFigure()
+    rects = ax.bar(x, y)
+    for rect in rects:  # rects 是柱子的集合
+        height = rect.get_height()
+        ax.text(rect.get_x() + rect.get_width() / 2, height, str(height), ha='center', va='bottom')
+    saveFigure(fig, ax, title, xlabel, ylabel, imgPath)
+
+def renderAnchors(anchors, title, imgPath):
+    fig, ax = newFigure()
+    for w, h in anchors:
+        ax.add_patch(Rectangle((-w / 2, -h / 2), w, h, fill=False))
+    limit = anchors.max() / 2 * 1.05
+    ax.set_xlim(-limit, limit)
+    ax.set_ylim(-limit, limit)
+    ax.set_aspect('equal')
+    saveFigure(fig, ax, title, 'W', 'H', imgPath)
+
+def renderPie(size, labels, title, imgPath):
+    fig, ax = newFigure()
+    ax.pie(size, labels=labels, labeldistance=1.1,
+           autopct="%1.1f%%", shadow=False, startangle=90, pctdistance=0.6)
+    ax.set_title(title)
+    ax.axis("equal")  # 设置横轴和纵轴大小相等，这样饼才是圆的
+    fig.savefig(imgPath)
+
 
 class Draw:
-    def __init__(self, outPath):
+    def __init__(self, outPath, densityThreshold=100000, densityBins=256, densityLog=True,
+                 workers=1, categoryPlots=True):
+        """
+        :param outPath: result path
+        :param densityThreshold: scatters with more points than this are drawn as a 2D histogram
+        :param densityBins: number of bins on each axis of the 2D histogram
+        :param densityLog: log color scale for the 2D histogram
+        :param workers: number of processes rendering figures, call close() to wait for them
+        :param categoryPlots: draw the per-category bbox W & H scatters
+        """
         self.outPath = os.path.join(outPath, 'img')
+        if not os.path.exists(self.outPath):
+            os.makedirs(self.outPath)
+        self.densityThreshold = densityThreshold
+        self.densityBins = densityBins
+        self.densityLog = densityLog
+        self.categoryPlots = categoryPlots
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.futures = []
 
-    def drawImageWHScatter(self, imagesWH):
+    def submit(self, render, *args):
+        """
+        render a figure, its last argument is the image path, which also names it in the profile
+        """
+        name = os.path.relpath(args[-1], self.outPath)
+        if self.executor is None:
+            with stage(name):
+                render(*args)
+        else:
+            self.futures.append((name, self.executor.submit(timed, render, *args)))
+
+    def close(self):
+        """
+        wait until every figure is written
+        """
+        if self.executor is not None:
+            for name, future in self.futures:
+                add(name, future.result())
+            self.executor.shutdown()
+            self.futures = []
+
+    def drawStatistics(self, stats):
+        """
+        draw every figure of a Statistics
+        :param stats: utils.statistics.Statistics
+        """
+        self.drawEachCategoryBboxWH(stats.eachCategoriesBbox)
+        self.drawImageWHScatter(stats.imagesWH, stats.imageWHGrid)
+        self.drawBboxWHScatter(stats.bboxsWH, stats.bboxWHGrid)
+        self.drawSizeBboxNum(stats.sizeBboxNum)
+        self.drawAnchorRatioBar(stats.anchorRatioNum)
+        self.drawEachCategoryImagesNum(stats.eachCategoryImageNum)
+        self.drawEachCategoryNum(stats.eachCategoriesNum)
+        self.drawEachImageBboxNum(stats.eachImageBboxNum)
+        if stats.anchors is not None:
+            self.drawAnchors(stats.anchors)
+        if stats.overlapMaxIoUNum:
+            self.drawOverlapNeighbourNum(stats.overlapNeighbourNum)
+            self.drawOverlapMaxIoUNum(stats.overlapMaxIoUNum)
+            self.drawEachCategoryOverlapNum(stats.eachCategoryOverlapNum)
+
+    def drawImageWHScatter(self, imagesWH, grid=None):
+        if grid is not None and grid.total > self.densityThreshold:
+            self.drawGrid(grid, "Scatter of image W & H", 'W', 'H', 'imageWH.png')
+            return
         self.drawScatter(imagesWH[0],
             imagesWH[1],
             "Scatter of image W & H",
             'W', 'H',
             'imageWH.png')
 
-    def drawBboxWHScatter(self, bboxsWH):
+    def drawBboxWHScatter(self, bboxsWH, grid=None):
+        if grid is not None and grid.total > self.densityThreshold:
+            self.drawGrid(grid, "Scatter of bbox W & H", 'W', 'H', 'bboxWH.png')
+            return
         self.drawScatter(bboxsWH[0],
             bboxsWH[1],
             "Scatter of bbox W & H",
             'W', 'H',
             'bboxWH.png')
 
-    def drawAnchorRatioBar(self, anchorRatios):
-        r_dict = {item: anchorRatios.count(item) for item in set(anchorRatios)}
-
-        self.drawBar(r_dict.keys(), r_dict.values(),
+    def drawAnchorRatioBar(self, anchorRatioNum):
+        self.drawBar(anchorRatioNum.keys(), anchorRatioNum.values(),
                 'AnchorBoxRatioBar', 'ratio', 'num', 'AnchorBoxRatio.png')
 
     def drawEachCategoryNum(self, eachCategoriesNum):
@@ -37,10 +163,8 @@ class Draw:
         self.drawBar(eachCategoryImageNum.keys(), eachCategoryImageNum.values(),
             'the numbers of images for each category', 'category', 'num', 'EachCategoryImagesNum.png')
 
-    def drawEachImageBboxNum(self, eachImageBboxNum_list):
-        c_dict = {item: eachImageBboxNum_list.count(item) for item in set(eachImageBboxNum_list)}
-
-        self.drawBar(c_dict.keys(), c_dict.values(),
+    def drawEachImageBboxNum(self, eachImageBboxNum):
+        self.drawBar(eachImageBboxNum.keys(), eachImageBboxNum.values(),
             'the numbers of bboxes included in each image',
             'numbers of bboxes in each image', 'num', 'EachImageBboxNum.png')
 
@@ -48,13 +172,35 @@ class Draw:
         self.drawBar(sizeBboxNum.keys(), sizeBboxNum.values(),
             'Number of bbox in different sizes', 'size', 'num', 'SizeBboxNum.png')
 
+    def drawOverlapNeighbourNum(self, overlapNeighbourNum):
+        self.drawBar(overlapNeighbourNum.keys(), overlapNeighbourNum.values(),
+            'the numbers of boxes each bbox overlaps', 'overlapping boxes', 'num', 'OverlapNeighbourNum.png')
+
+    def drawOverlapMaxIoUNum(self, overlapMaxIoUNum):
+        self.drawBar(overlapMaxIoUNum.keys(), overlapMaxIoUNum.values(),
+            'largest IoU of each bbox with another bbox of its image', 'IoU', 'num', 'OverlapMaxIoUNum.png')
+
+    def drawEachCategoryOverlapNum(self, eachCategoryOverlapNum):
+        self.drawBar(eachCategoryOverlapNum.keys(), eachCategoryOverlapNum.values(),
+            'the numbers of overlapping bboxes for each category', 'category', 'num', 'EachCategoryOverlapNum.png')
+
     def drawEachCategoryBboxWH(self, eachCategoriesBbox):
+        if not self.categoryPlots:
+            return
         if not os.path.exists(os.path.join(self.outPath, 'EachCategoryBboxWH')):
             os.makedirs(os.path.join(self.outPath, 'EachCategoryBboxWH'))
         for c in eachCategoriesBbox:
             self.drawScatter(eachCategoriesBbox[c][0], eachCategoriesBbox[c][1], f'{c}WH', 'w', 'h', os.path.join('EachCategoryBboxWH', f'{c}WH.png'))
 
 
+    def drawAnchors(self, anchors):
+        """
+        draw clustered anchors as centered boxes
+        :param anchors: result of utils.anchors.clusterAnchors
+        """
+        title = 'anchors, mean IoU %.3f, recall@%.2f %.3f' % (anchors['meanIoU'], anchors['recallThreshold'], anchors['recall'])
+        self.submit(renderAnchors, anchors['anchors'], title, os.path.join(self.outPath, 'Anchors.png'))
+
     def drawScatter(self, x, y, title, xlabel, ylabel, imgName):
         """
         draw a scatter
@@ -66,8 +212,38 @@ class Draw:
         :param imgName: name of image
         :return:
         """
-        plt.scatter(x, y)
-        self._extracted_from_drawBar_4(title, xlabel, ylabel, imgName)
+        if len(x) > self.densityThreshold:
+            self.drawDensity(x, y, title, xlabel, ylabel, imgName)
+            return
+        self.submit(renderScatter, x, y, title, xlabel, ylabel, os.path.join(self.outPath, imgName))
+
+    def drawDensity(self, x, y, title, xlabel, ylabel, imgName):
+        """
+        draw a 2D histogram instead of a scatter, its cost depends on densityBins, not on the number of points
+        :param x: x
+        :param y: y
+        :param title: title of image
+        :param xlabel: x label of image
+        :param ylabel: y label of image
+        :param imgName: name of image
+        :return:
+        """
+        self.submit(renderDensity, x, y, self.densityBins, self.densityLog,
+                    title, xlabel, ylabel, os.path.join(self.outPath, imgName))
+
+    def drawGrid(self, grid, title, xlabel, ylabel, imgName):
+        """
+        draw a precomputed WHGrid as a 2D histogram
+        :param grid: WHGrid
+        :param title: title of image
+        :param xlabel: x label of image
+        :param ylabel: y label of image
+        :param imgName: name of image
+        :return:
+        """
+        xedges, yedges = grid.edges()
+        self.submit(renderCounts, grid.counts, xedges, yedges, self.densityLog,
+                    title, xlabel, ylabel, os.path.join(self.outPath, imgName))
 
     def drawBar(self, x, y, title, xlabel, ylabel, imgName):
         """
@@ -80,19 +256,7 @@ class Draw:
         :param imgName: name of image
         :return:
         """
-        rects = plt.bar(x, y)
-        for rect in rects:  # rects 是柱子的集合
-            height = rect.get_height()
-            plt.text(rect.get_x() + rect.get_width() / 2, height, str(height), ha='center', va='bottom')
-        self._extracted_from_drawBar_4(title, xlabel, ylabel, imgName)
-
-    # TODO Rename this here and in `drawScatter` and `drawBar`
-    def _extracted_from_drawBar_4(self, title, xlabel, ylabel, imgName):
-        plt.title(title)
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
-        plt.savefig(os.path.join(self.outPath, imgName))
-        plt.close()
+        self.submit(renderBar, list(x), list(y), title, xlabel, ylabel, os.path.join(self.outPath, imgName))
 
     def drawPie(self, size, labels, title, imgName):
         """
@@ -103,9 +267,4 @@ class Draw:
         :param imgName: name of image
         :return:
         """
-        plt.pie(size, labels=labels, labeldistance=1.1,
-                autopct="%1.1f%%", shadow=False, startangle=90, pctdistance=0.6)
-        plt.title(title)
-        plt.axis("equal")  # 设置横轴和纵轴大小相等，这样饼才是圆的
-        plt.savefig(os.path.join(self.outPath, imgName))
-        plt.close()
\ No newline at end of file
+        self.submit(renderPie, list(size), list(labels), title, os.path.join(self.outPath, imgName))
@@ -1,45 +1,227 @@
+import csv
 import os
-import pandas as pd
+import re
 
-class Excel:
+import numpy as np
+
+from utils.profiling import stage
+
+# rows per xlsx sheet, one less than the 1048576 limit for the header
+XLSX_MAX_ROWS = 1048575
+
+
+def toList(column):
+    column = column.tolist() if isinstance(column, np.ndarray) else list(column)
+    return [v.item() if isinstance(v, np.generic) else v for v in column]
+
+
+class XlsxWriter:
+    """
+    one .xlsx file per table, written row by row in openpyxl's write-only mode.
+    tables longer than an xlsx sheet continue on sheet2, sheet3...
+    """
+    def __init__(self, outPath):
+        self.outPath = outPath
+
+    def newWorkbook(self):
+        import openpyxl
+        return openpyxl.Workbook(write_only=True)
+
+    def writeSheets(self, workbook, sheetName, columns):
+        values = [toList(c) for c in columns.values()]
+        rows = len(values[0]) if values else 0
+        for i, start in enumerate(range(0, max(rows, 1), XLSX_MAX_ROWS)):
+            sheet = workbook.create_sheet(sheetName if i == 0 else f'{sheetName[:26]}_{i + 1}')
+            sheet.append(list(columns))
+            for row in zip(*(v[start:start + XLSX_MAX_ROWS] for v in values)):
+                sheet.append(row)
+
+    def write(self, name, columns):
+        """
+        :param name: table name, may contain a sub directory
+        :param columns: {column name: values}
+        """
+        workbook = self.newWorkbook()
+        self.writeSheets(workbook, 'sheet1', columns)
+        workbook.save(os.path.join(self.outPath, f'{name}.xlsx'))
+
+    def close(self):
+        pass
+
+
+class WorkbookWriter(XlsxWriter):
+    """
+    every table as a sheet of a single workbook
+    """
+    def __init__(self, outPath, filename='statistics.xlsx'):
+        super().__init__(outPath)
+        self.filename = filename
+        self.workbook = None
+        self.sheetNames = set()
+
+    def write(self, name, columns):
+        if self.workbook is None:
+            self.workbook = self.newWorkbook()
+        sheetName = re.sub(r'[\[\]:*?/\\]', '_', os.path.basename(name))[:31]
+        while sheetName in self.sheetNames:
+            sheetName = f'{sheetName[:28]}_{len(self.sheetNames)}'
+        self.sheetNames.add(sheetName)
+        self.writeSheets(self.workbook, sheetName, columns)
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.save(os.path.join(self.outPath, self.filename))
+
+
+class CsvWriter:
+    """
+    one .csv file per table
+    """
+    def __init__(self, outPath):
+        self.outPath = outPath
+
+    def write(self, name, columns):
+        with open(os.path.join(self.outPath, f'{name}.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(list(columns))
+            writer.writerows(zip(*(toList(c) for c in columns.values())))
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """
+    one .parquet file per table, requires pyarrow
+    """
     def __init__(self, outPath):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('Parquet export requires pyarrow, please run `pip install pyarrow`.')
+        self.outPath = outPath
+
+    def write(self, name, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table({k: v if isinstance(v, np.ndarray) else toList(v) for k, v in columns.items()})
+        pq.write_table(table, os.path.join(self.outPath, f'{name}.parquet'))
 
+    def close(self):
+        pass
+
+
+WRITERS = {'xlsx': XlsxWriter, 'workbook': WorkbookWriter, 'csv': CsvWriter, 'parquet': ParquetWriter}
+
+
+class Excel:
+    def __init__(self, outPath, rawFormat='xlsx', summaryFormat='xlsx'):
+        """
+        :param outPath: result path
+        :param rawFormat: format of the per-image / per-box W & H tables, one of WRITERS
+        :param summaryFormat: format of the count tables, one of WRITERS
+        """
         self.outPath = os.path.join(outPath, 'excel')
         if not os.path.exists(self.outPath):
             os.mkdir(self.outPath)
 
+        self.raw = WRITERS[rawFormat](self.outPath)
+        self.summary = self.raw if summaryFormat == rawFormat else WRITERS[summaryFormat](self.outPath)
+
+    def close(self):
+        """
+        write out anything still buffered, e.g. the single workbook
+        """
+        with stage('close'):
+            self.raw.close()
+            if self.summary is not self.raw:
+                self.summary.close()
+
+    def write(self, writer, name, columns):
+        """
+        :param writer: self.raw or self.summary
+        :param name: table name, without extension
+        :param columns: {column name: values}
+        """
+        with stage(name, len(next(iter(columns.values()), []))):
+            writer.write(name, columns)
+
+    def exportStatistics(self, stats):
+        """
+        write every table of a Statistics
+        :param stats: utils.statistics.Statistics
+        """
+        self.imageWH(stats.imagesWH)
+        self.bboxWH(stats.bboxsWH)
+        self.anchorRatio(stats.anchorRatioNum)
+        self.eachCategory(stats.eachCategoriesNum)
+        self.eachCategoryImagesNum(stats.eachCategoryImageNum)
+        self.eachImageBboxNum(stats.eachImageBboxNum)
+        self.sizeBboxNum(stats.sizeBboxNum)
+        self.eachCategoryBboxWH(stats.eachCategoriesBbox)
+        if stats.anchors is not None:
+            self.anchors(stats.anchors)
+        if stats.overlapMaxIoUNum:
+            self.overlapNeighbourNum(stats.overlapNeighbourNum)
+            self.overlapMaxIoUNum(stats.overlapMaxIoUNum)
+            self.eachCategoryOverlapNum(stats.eachCategoryOverlapNum)
+            self.duplicates(stats.duplicates)
+
     def imageWH(self, imagesWH):
-        self.excel2cols('W', 'H', imagesWH, 'imageWH.xlsx')
+        self.excel2cols('W', 'H', imagesWH, 'imageWH', raw=True)
 
     def bboxWH(self, bboxsWH):
-        self.excel2cols('W', 'H', bboxsWH, 'bboxsWH.xlsx')
+        self.excel2cols('W', 'H', bboxsWH, 'bboxsWH', raw=True)
 
-    def anchorRatio(self, anchorRatios):
-        r_dict = {item: anchorRatios.count(item) for item in set(anchorRatios)}
-        self.excel2cols('ratio', 'num', [r_dict.keys(), r_dict.values()], 'anchorRatios.xlsx')
+    def anchorRatio(self, anchorRatioNum):
+        self.excel2cols('ratio', 'num', [anchorRatioNum.keys(), anchorRatioNum.values()], 'anchorRatios')
 
     def eachCategory(self, eachCategoriesNum):
-        self.excel2cols('category', 'num', [eachCategoriesNum.keys(), eachCategoriesNum.values()], 'eachCategory.xlsx')
+        self.excel2cols('category', 'num', [eachCategoriesNum.keys(), eachCategoriesNum.values()], 'eachCategory')
 
     def eachCategoryImagesNum(self, eachCategoryImageNum):
-        self.excel2cols('category', 'num', [eachCategoryImageNum.keys(), eachCategoryImageNum.values()], 'eachCategoryImageNum.xlsx')
+        self.excel2cols('category', 'num', [eachCategoryImageNum.keys(), eachCategoryImageNum.values()], 'eachCategoryImageNum')
 
-    def eachImageBboxNum(self, eachImageBboxNum_list):
-        c_dict = {item: eachImageBboxNum_list.count(item) for item in set(eachImageBboxNum_list)}
-        self.excel2cols('numbers of bboxes in each image', 'num', [c_dict.keys(), c_dict.values()], 'eachImageBboxNum.xlsx')
+    def eachImageBboxNum(self, eachImageBboxNum):
+        self.excel2cols('numbers of bboxes in each image', 'num', [eachImageBboxNum.keys(), eachImageBboxNum.values()], 'eachImageBboxNum')
 
     def sizeBboxNum(self, sizeBboxNum):
-        self.excel2cols('Number of bbox in different sizes', 'num', [sizeBboxNum.keys(), sizeBboxNum.values()], 'sizeBboxNum.xlsx')
+        self.excel2cols('Number of bbox in different sizes', 'num', [sizeBboxNum.keys(), sizeBboxNum.values()], 'sizeBboxNum')
+
+    def overlapNeighbourNum(self, overlapNeighbourNum):
+        self.excel2cols('overlapping boxes', 'num', [overlapNeighbourNum.keys(), overlapNeighbourNum.values()], 'overlapNeighbourNum')
+
+    def overlapMaxIoUNum(self, overlapMaxIoUNum):
+        self.excel2cols('largest IoU', 'num', [overlapMaxIoUNum.keys(), overlapMaxIoUNum.values()], 'overlapMaxIoUNum')
+
+    def eachCategoryOverlapNum(self, eachCategoryOverlapNum):
+        self.excel2cols('category', 'num', [eachCategoryOverlapNum.keys(), eachCategoryOverlapNum.values()], 'eachCategoryOverlapNum')
+
+    def duplicates(self, duplicates):
+        names = ['file', 'category', 'other category', 'IoU', 'x1', 'y1', 'x2', 'y2',
+                 'other x1', 'other y1', 'other x2', 'other y2']
+        columns = list(zip(*duplicates)) if duplicates else [[] for _ in names]
+        self.write(self.raw, 'duplicates', dict(zip(names, columns)))
+
+    def anchors(self, anchors):
+        self.write(self.summary, 'anchors', {'W': anchors['anchors'][:, 0], 'H': anchors['anchors'][:, 1],
+                                             'num': anchors['num'], 'mean IoU': anchors['clusterIoU']})
+        self.write(self.summary, 'anchorsIoU', {'metric': ['mean IoU', f'recall@{anchors["recallThreshold"]}'],
+                                                'value': [anchors['meanIoU'], anchors['recall']]})
 
     def eachCategoryBboxWH(self, eachCategoriesBbox):
         if not os.path.exists(os.path.join(self.outPath, 'EachCategoryBboxWH')):
             os.makedirs(os.path.join(self.outPath, 'EachCategoryBboxWH'))
         for c in eachCategoriesBbox:
-            self.excel2cols('W', 'H', eachCategoriesBbox[c], os.path.join('EachCategoryBboxWH', f'{c}WH.xlsx'))
+            self.excel2cols('W', 'H', eachCategoriesBbox[c], os.path.join('EachCategoryBboxWH', f'{c}WH'), raw=True)
 
 
-    def excel2cols(self, col1, col2, list, filename):
-        col1 = col1
-        col2 = col2
-        data = pd.DataFrame({col1: list[0], col2: list[1]})
-        data.to_excel(os.path.join(self.outPath, filename), sheet_name='sheet1', index=False)
+    def excel2cols(self, col1, col2, list, name, raw=False):
+        """
+        :param col1: name of first column
+        :param col2: name of second column
+        :param list: [values of first column, values of second column]
+        :param name: table name, without extension
+        :param raw: per-image / per-box table instead of a count table
+        """
+        self.write(self.raw if raw else self.summary, name, {col1: list[0], col2: list[1]})
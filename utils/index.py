@@ -0,0 +1,124 @@
+import numpy as np
+
+from utils.data import calculateAnchorRatio, getSizeType
+from utils.table import AnnotationTable
+
+SIZE_NAMES = ['small', 'medium', 'large']
+# anchor ratios above this share its bucket, which keeps the packed box keys small
+MAX_RATIO = 1000
+
+
+class DatasetIndex:
+    """
+    inverted indexes of an AnnotationTable for queries by images:
+    (category, size, anchor ratio) of a box -> images holding such a box,
+    number of boxes -> images, both answered with searches over sorted arrays
+    """
+    def __init__(self, table, source=None):
+        """
+        :param table: AnnotationTable
+        :param source: (format, path) of the dataset the table was read from, kept so that subsets
+                       can be written from the original files
+        """
+        self.table = table
+        self.source = source
+        n = table.imagesNum
+        w, h = table.bboxWH()
+        size = getSizeType(w, h) - 1
+        ratio = calculateAnchorRatio(w, h)
+        # 0 for boxes without a valid ratio, negative ones of flipped boxes (x2 < x1) included
+        ratioKey = np.where(ratio >= 0, np.minimum(ratio, MAX_RATIO), -1).astype(np.int64) + 1
+        self.ratioKeys = int(ratioKey.max()) + 1 if len(ratioKey) else 1
+
+        # every distinct (box key, image) pair, sorted by key: the images of key k are
+        # keyImages[keyOffsets[i]:keyOffsets[i + 1]] where keys[i] == k
+        boxKey = (table.categoryIds * len(SIZE_NAMES) + size) * self.ratioKeys + ratioKey
+        pairs = np.unique(boxKey * max(n, 1) + table.imageIds)
+        pairKeys, self.keyImages = np.divmod(pairs, max(n, 1))
+        self.keys, starts = np.unique(pairKeys, return_index=True)
+        self.keyOffsets = np.append(starts, len(pairs)).astype(np.int64)
+
+        # images sorted by number of boxes
+        boxCounts = np.bincount(table.imageIds, minlength=n)
+        self.countOrder = np.argsort(boxCounts, kind='stable')
+        self.sortedCounts = boxCounts[self.countOrder]
+
+    def categoryIds(self, categories):
+        unknown = [c for c in categories if c not in self.table.categories]
+        if unknown:
+            raise ValueError(f'Unknown categories {unknown}, the dataset has {self.table.categories}')
+        return [self.table.categories.index(c) for c in categories]
+
+    def query(self, categories=None, sizes=None, minRatio=None, maxRatio=None, minBoxes=None, maxBoxes=None):
+        """
+        images holding a box that matches every given box condition and whose number of boxes is in range,
+        conditions left to None are not checked
+        :param categories: category names, a box matches any of them
+        :param sizes: 'small', 'medium' and / or 'large'
+        :param minRatio: smallest anchor ratio (long side / short side, rounded) of the box,
+                         ratios above MAX_RATIO count as MAX_RATIO
+        :param maxRatio: largest anchor ratio of the box
+        :param minBoxes: smallest number of boxes of the image
+        :param maxBoxes: largest number of boxes of the image
+        :return: sorted image rows of the table
+        """
+        images = np.arange(self.table.imagesNum)
+        if categories is not None or sizes is not None or minRatio is not None or maxRatio is not None:
+            rest, ratioKey = np.divmod(self.keys, self.ratioKeys)
+            category, size = np.divmod(rest, len(SIZE_NAMES))
+            ratio = ratioKey - 1
+            match = np.ones(len(self.keys), dtype=bool)
+            if categories is not None:
+                match &= np.isin(category, self.categoryIds(categories))
+            if sizes is not None:
+                match &= np.isin(size, [SIZE_NAMES.index(s) for s in sizes])
+            if minRatio is not None:
+                match &= (ratio >= minRatio) & (ratio >= 0)
+            if maxRatio is not None:
+                match &= (ratio <= maxRatio) & (ratio >= 0)
+            matched = np.flatnonzero(match)
+            images = np.unique(np.concatenate([self.keyImages[self.keyOffsets[i]:self.keyOffsets[i + 1]]
+                                               for i in matched] + [np.zeros(0, dtype=np.int64)]))
+        if minBoxes is not None or maxBoxes is not None:
+            lo = np.searchsorted(self.sortedCounts, minBoxes if minBoxes is not None else 0, side='left')
+            hi = np.searchsorted(self.sortedCounts, maxBoxes, side='right') if maxBoxes is not None else len(self.sortedCounts)
+            images = np.intersect1d(images, self.countOrder[lo:hi])
+        return images
+
+    def subset(self, images):
+        """
+        :param images: image rows, e.g. the result of query
+        :return: AnnotationTable of these images with all their boxes
+        """
+        return self.table.selectImages(images)
+
+    def save(self, path):
+        """
+        write the table and its indexes to a compressed npz file
+        :param path: npz file path
+        """
+        t = self.table
+        np.savez_compressed(path, files=np.array(t.files, dtype=str), filenames=np.array(t.filenames, dtype=str),
+                            imagesW=t.imagesW, imagesH=t.imagesH, categories=np.array(t.categories, dtype=str),
+                            imageIds=t.imageIds, categoryIds=t.categoryIds, x1=t.x1, y1=t.y1, x2=t.x2, y2=t.y2,
+                            source=np.array(self.source if self.source is not None else [], dtype=str),
+                            ratioKeys=np.array(self.ratioKeys), keys=self.keys, keyOffsets=self.keyOffsets,
+                            keyImages=self.keyImages, countOrder=self.countOrder, sortedCounts=self.sortedCounts)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: npz file written by save
+        :return: DatasetIndex, without reading the dataset or rebuilding the indexes
+        """
+        index = cls.__new__(cls)
+        with np.load(path) as data:
+            index.table = AnnotationTable(data['files'].tolist(), data['filenames'].tolist(),
+                                          data['imagesW'], data['imagesH'], data['categories'].tolist(),
+                                          data['imageIds'], data['categoryIds'],
+                                          data['x1'], data['y1'], data['x2'], data['y2'])
+            index.source = tuple(data['source'].tolist()) or None
+            index.ratioKeys = int(data['ratioKeys'])
+            for name in ['keys', 'keyOffsets', 'keyImages', 'countOrder', 'sortedCounts']:
+                setattr(index, name, data[name])
+        return index
@@ -0,0 +1,87 @@
+import numpy as np
+
+from utils.data import countValues
+
+
+def overlapPairs(table, maxPairs=5000000):
+    """
+    pairs of boxes of the same image that overlap, without comparing every pair:
+    boxes are sorted by image then x1, and a box is only paired with the boxes after it
+    that start before it ends (sort and sweep on x), in batches of at most maxPairs candidates
+    :param table: AnnotationTable
+    :param maxPairs: number of candidate pairs evaluated at once
+    :return: generator of (i, j, iou) arrays, i and j are box rows of table, iou > 0
+    """
+    n = table.bboxNum
+    if n < 2:
+        return
+    order = np.lexsort((table.x1, table.imageIds))
+    image = table.imageIds[order]
+    x1, y1, x2, y2 = table.x1[order], table.y1[order], table.x2[order], table.y2[order]
+    area = (x2 - x1) * (y2 - y1)
+
+    # x1 of each image shifted past the previous image, so one searchsorted stays inside the image
+    minX = min(x1.min(), x2.min())
+    span = max(x1.max(), x2.max()) - minX + 1
+    key = image * span + (x1 - minX)
+    end = np.searchsorted(key, image * span + (x2 - minX), side='left')
+    counts = np.maximum(end - np.arange(n) - 1, 0)
+    cumCounts = np.cumsum(counts)
+
+    start = 0
+    while start < n:
+        done = cumCounts[start - 1] if start else 0
+        stop = max(int(np.searchsorted(cumCounts, done + maxPairs, side='right')), start + 1)
+        c = counts[start:stop]
+        i = np.repeat(np.arange(start, stop), c)
+        j = i + 1 + np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        start = stop
+        if not len(i):
+            continue
+
+        w = np.minimum(x2[i], x2[j]) - np.maximum(x1[i], x1[j])
+        h = np.minimum(y2[i], y2[j]) - np.maximum(y1[i], y1[j])
+        inter = np.clip(w, 0, None) * np.clip(h, 0, None)
+        union = area[i] + area[j] - inter
+        with np.errstate(divide='ignore', invalid='ignore'):
+            iou = np.where(union > 0, inter / union, 0)
+        keep = iou > 0
+        yield order[i[keep]], order[j[keep]], iou[keep]
+
+def overlapStatistics(table, overlapIoU=0.5, duplicateIoU=0.9):
+    """
+    relate the boxes within each image
+    :param table: AnnotationTable
+    :param overlapIoU: IoU from which a box counts as overlapping another one
+    :param duplicateIoU: IoU from which a pair of boxes is reported as duplicate
+    :return: {'overlapNeighbourNum': {number of boxes a box overlaps: boxes},
+              'overlapMaxIoUNum': {IoU bin of a box's largest overlap: boxes},
+              'eachCategoryOverlapNum': {category: boxes overlapping another box with IoU >= overlapIoU},
+              'duplicates': [[file, category, other category, IoU, x1, y1, x2, y2, other x1, y1, x2, y2], ...]}
+    """
+    n = table.bboxNum
+    maxIoU = np.zeros(n)
+    neighbours = np.zeros(n, dtype=np.int64)
+    duplicates = []
+    for i, j, iou in overlapPairs(table):
+        np.maximum.at(maxIoU, i, iou)
+        np.maximum.at(maxIoU, j, iou)
+        neighbours += np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+        d = iou >= duplicateIoU
+        duplicates.append((i[d], j[d], iou[d]))
+
+    bins = countValues(np.minimum(maxIoU * 10, 9).astype(np.int64))
+    categoryOverlap = np.bincount(table.categoryIds[maxIoU >= overlapIoU], minlength=len(table.categories))
+    categoryOrder = np.unique(table.categoryIds)
+
+    duplicateRows = []
+    for i, j, iou in duplicates:
+        for a, b, v in zip(i.tolist(), j.tolist(), iou.tolist()):
+            duplicateRows.append([table.files[table.imageIds[a]],
+                                  table.categories[table.categoryIds[a]], table.categories[table.categoryIds[b]], v,
+                                  table.x1[a], table.y1[a], table.x2[a], table.y2[a],
+                                  table.x1[b], table.y1[b], table.x2[b], table.y2[b]])
+    return {'overlapNeighbourNum': countValues(neighbours),
+            'overlapMaxIoUNum': {f'{b / 10:.1f}-{(b + 1) / 10:.1f}': v for b, v in bins.items()},
+            'eachCategoryOverlapNum': {table.categories[c]: int(categoryOverlap[c]) for c in categoryOrder},
+            'duplicates': [[v.item() if isinstance(v, np.generic) else v for v in row] for row in duplicateRows]}
@@ -0,0 +1,16 @@
+from collections import deque
+
+
+def boundedMap(executor, fn, jobs, limit):
+    """
+    executor.map that keeps at most limit jobs in flight, so results never pile up
+    faster than the caller consumes them
+    :return: generator of results, in job order
+    """
+    pending = deque()
+    for job in jobs:
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, job))
+    while pending:
+        yield pending.popleft().result()
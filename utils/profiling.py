@@ -0,0 +1,177 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+# the Profiler stages are recorded to, see Profiler.activate
+_active = None
+
+
+def peakRss():
+    """
+    :return: peak resident set size of this process in bytes, None where it is unknown
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def resetPeakRss():
+    """
+    restart the peak RSS from the current RSS, only possible on linux
+    :return: whether the peak was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def timed(fn, *args):
+    """
+    run fn(*args) and measure it, picklable so it can run in a worker process
+    :return: {'wall', 'cpu', 'peakRss'} of the call
+    """
+    resetPeakRss()
+    start, cpuStart = time.perf_counter(), time.process_time()
+    fn(*args)
+    return {'wall': time.perf_counter() - start, 'cpu': time.process_time() - cpuStart, 'peakRss': peakRss()}
+
+@contextmanager
+def stage(name, items=None):
+    """
+    record a stage to the active Profiler, a no-op when none is active
+    :param name: stage name, stages opened inside it are recorded as its children
+    :param items: number of items processed, can also be set on the yielded record
+    :return: context manager yielding the stage record
+    """
+    if _active is None:
+        yield {'items': items}
+    else:
+        with _active.stage(name, items) as record:
+            yield record
+
+def add(name, measured, items=None):
+    """
+    record a stage measured elsewhere, e.g. by timed in a worker process, as a child of the current stage
+    """
+    if _active is not None:
+        _active.add(name, measured, items)
+
+
+class Profiler:
+    """
+    wall time, CPU time, peak RSS and item count of nested stages,
+    a stage entered several times under the same parent, e.g. once per chunk, is summed into one record
+    """
+    def __init__(self, cprofileStage=None, cprofileFile=None):
+        """
+        :param cprofileStage: name of a stage to run under cProfile
+        :param cprofileFile: file the cProfile stats of that stage are written to
+        """
+        self.records = {}
+        self.open = []
+        self.cprofileStage = cprofileStage
+        self.cprofileFile = cprofileFile
+
+    @contextmanager
+    def activate(self):
+        """
+        record the stages of utils.profiling.stage to this profiler
+        """
+        global _active
+        previous, _active = _active, self
+        try:
+            yield self
+        finally:
+            _active = previous
+
+    def record(self, name):
+        path = tuple(r['name'] for r in self.open) + (name,)
+        if path not in self.records:
+            self.records[path] = {'name': name, 'path': '/'.join(path), 'depth': len(self.open), 'calls': 0,
+                                  'wall': 0.0, 'cpu': 0.0, 'peakRss': None, 'items': None}
+        record = self.records[path]
+        record['calls'] += 1
+        return record
+
+    def addItems(self, record, items):
+        if items is not None:
+            record['items'] = (record['items'] or 0) + items
+
+    def updatePeak(self, records, rss):
+        if rss is not None:
+            for record in records:
+                record['peakRss'] = max(record['peakRss'] or 0, rss)
+
+    @contextmanager
+    def stage(self, name, items=None):
+        record = self.record(name)
+        # the reset loses the peak reached so far, keep it in the open stages first
+        self.updatePeak(self.open, peakRss())
+        resetPeakRss()
+        self.open.append(record)
+
+        profile = None
+        if name == self.cprofileStage:
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+        start, cpuStart = time.perf_counter(), time.process_time()
+        current = {'items': items}
+        try:
+            yield current
+        finally:
+            record['wall'] += time.perf_counter() - start
+            record['cpu'] += time.process_time() - cpuStart
+            if profile is not None:
+                profile.disable()
+                self.writeCprofile(profile)
+            self.addItems(record, current['items'])
+            self.updatePeak(self.open, peakRss())
+            self.open.pop()
+
+    def add(self, name, measured, items=None):
+        record = self.record(name)
+        record['wall'] += measured['wall']
+        record['cpu'] += measured['cpu']
+        self.updatePeak([record], measured['peakRss'])
+        self.addItems(record, items)
+
+    def writeCprofile(self, profile):
+        import pstats
+        if self.cprofileFile is not None:
+            profile.dump_stats(self.cprofileFile)
+            print(f'cProfile stats of {self.cprofileStage} written to {self.cprofileFile}.')
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
+
+    def summary(self):
+        """
+        print every stage as a table
+        """
+        print('\n***************** Profile *****************\n')
+        print(f'{"stage":<40} {"calls":>6} {"wall (s)":>9} {"cpu (s)":>9} {"peak RSS (MB)":>14} {"items":>10}')
+        for r in self.records.values():
+            rss = '-' if r['peakRss'] is None else f'{r["peakRss"] / 2 ** 20:.1f}'
+            items = '-' if r['items'] is None else r['items']
+            print(f'{"  " * r["depth"] + r["name"]:<40.40} {r["calls"]:>6} {r["wall"]:9.3f} {r["cpu"]:9.3f} '
+                  f'{rss:>14} {items:>10}')
+        print('\n***************** Profile *****************\n')
+
+    def dump(self, path):
+        """
+        write every stage to a json file
+        :param path: json file path
+        """
+        with open(path, 'w') as f:
+            json.dump(list(self.records.values()), f, indent=1)
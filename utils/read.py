@@ -1,23 +1,32 @@
+from array import array
 from cmath import inf
+from concurrent.futures import ProcessPoolExecutor
 import glob
 import json
 import os
+import warnings
 import xml.etree.ElementTree as ET
 
+import numpy as np
+
+from utils.parallel import boundedMap
+from utils.profiling import stage
+from utils.table import AnnotationTable, chunkRecords, shardBounds
+
 
 def readXml(xml, ignoreDiff=False):
     """
     read single xml file
     :param xml: path of xml file
     :param ignoreDiff: whether to ignore difficult. defalut: False
-    :return: xmlInfo, format: {'file': '', 'filename': '', 'width': '', 'height': '', 'bndbox': []}
+    :return: xmlInfo, format: {'file': '', 'filename': '', 'width': '', 'height': '', 'objNames': [], 'boxes': []}
     """
     root = ET.parse(xml).getroot()
     filename = root.find('filename').text
     size = root.find('size')
     width = size.find('width').text
     height = size.find('height').text
-    xmlInfo = {'file': xml, 'filename': filename, 'width': width, 'height': height, 'bndbox': []}
+    xmlInfo = {'file': xml, 'filename': filename, 'width': width, 'height': height, 'objNames': [], 'boxes': []}
 
     for obj in root.findall('object'):
         if ignoreDiff and obj.find('difficult') is not None:
@@ -26,51 +35,537 @@ def readXml(xml, ignoreDiff=False):
                 continue
         objName = obj.find('name').text
         bndbox = obj.find('bndbox')
-        xmin = bndbox.find('xmin').text
-        ymin = bndbox.find('ymin').text
-        xmax = bndbox.find('xmax').text
-        ymax = bndbox.find('ymax').text
-        
-        tempBox = {'objName': objName, 'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}
-        xmlInfo['bndbox'].append(tempBox)
+        xmin = float(bndbox.find('xmin').text)
+        ymin = float(bndbox.find('ymin').text)
+        xmax = float(bndbox.find('xmax').text)
+        ymax = float(bndbox.find('ymax').text)
+
+        xmlInfo['objNames'].append(objName)
+        xmlInfo['boxes'].append([xmin, ymin, xmax, ymax])
     return xmlInfo
 
-def readVoc(xmlPath):
+def readXmlSafe(xml):
+    """
+    read single xml file without raising
+    :param xml: path of xml file
+    :return: (xmlInfo, None) on success, (None, error message) on failure
+    """
+    try:
+        return readXml(xml), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+def readXmlsSafe(xmls):
+    """
+    :param xmls: paths of xml files
+    :return: list of readXmlSafe results, one per file
+    """
+    return [readXmlSafe(xml) for xml in xmls]
+
+def iterVoc(xmlPath, workers=1, cache=None, shard=None):
+    """
+    read multiple xml file lazily, one xmlInfo at a time in sorted file order
+    files that fail to parse are skipped and listed in a summary at the end
+    :param xmlPath: path of xml file directory
+    :param workers: number of parser processes, 1 parses in the current process
+    :param cache: AnnotationCache, only new or modified files are parsed when given
+    :param shard: (index, count), only read the index-th of count consecutive blocks of files
+    :return: generator of xmlInfo
+    """
+    allXmlList = glob.glob(xmlPath + os.sep + '*.xml')
+    allXmlList.sort()
+    xmlList = allXmlList[slice(*shardBounds(len(allXmlList), shard))] if shard is not None else allXmlList
+
+    cached = cache.fresh(xmlList) if cache is not None else {}
+    todoList = [xml for xml in xmlList if xml not in cached]
+    executor = None
+    if workers > 1 and len(todoList) > 1:
+        # files are sent in chunks, and only a few chunks are in flight, so parsed records
+        # never pile up in this process faster than they are consumed
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunkSize = max(1, min(256, len(todoList) // (workers * 4)))
+        chunks = (todoList[i:i + chunkSize] for i in range(0, len(todoList), chunkSize))
+        parsed = (result for results in boundedMap(executor, readXmlsSafe, chunks, workers * 2) for result in results)
+    else:
+        parsed = map(readXmlSafe, todoList)
+
+    errors = []
+    try:
+        for xml in xmlList:
+            if xml in cached:
+                # looked up by the key fresh matched, so the entry is found even if the file changed since
+                yield cache.get(xml, cached[xml])
+                continue
+            xmlInfo, error = next(parsed)
+            if error is not None:
+                errors.append((xml, error))
+                continue
+            if cache is not None:
+                cache.put(xml, xmlInfo)
+            yield xmlInfo
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if cache is not None:
+        cache.prune(xmlPath, allXmlList)
+        print(f'{len(xmlList) - len(todoList)} of {len(xmlList)} xml files loaded from cache.')
+
+    if errors:
+        print('\n============ Errors ============\n')
+        for xml, error in errors:
+            print(xml, error)
+        print(f'{len(errors)} of {len(xmlList)} xml files could not be parsed and were skipped.')
+        print('\n============ Errors ============\n')
+
+def readVoc(xmlPath, workers=1, cache=None, shard=None):
     """
     read multiple xml file
     :param xmlPath: path of xml file directory
-    :return: list of xmlInfo
+    :param workers: number of parser processes, 1 parses in the current process
+    :param cache: AnnotationCache, only new or modified files are parsed when given
+    :param shard: (index, count), only read the index-th of count consecutive blocks of files
+    :return: AnnotationTable
     """
-    vocInfo = []
-    xmlList = glob.glob(xmlPath + os.sep + '*.xml')
-    xmlList.sort()
-    for xml in xmlList:
-        xmlFile = xml
-        vocInfo.append(readXml(xmlFile))
-    return vocInfo
+    with stage('parse xml') as record:
+        table = AnnotationTable.fromRecords(iterVoc(xmlPath, workers=workers, cache=cache, shard=shard))
+        record['items'] = table.imagesNum
+    return table
+
+COCO_FIELDS = {
+    'images.item.id': 'id',
+    'images.item.file_name': 'file_name',
+    'images.item.width': 'width',
+    'images.item.height': 'height',
+    'categories.item.id': 'id',
+    'categories.item.name': 'name',
+    'annotations.item.image_id': 'image_id',
+    'annotations.item.category_id': 'category_id',
+}
+COCO_SECTIONS = {'images.item': 'images', 'categories.item': 'categories', 'annotations.item': 'annotations'}
 
-def readCoco(jsonFile):
+def iterCoco(jsonFile):
     """
-    read coco json file
+    stream a coco json file as parser events, keeping only the fields needed for analysis.
+    'segmentation' and every other unused field is skipped without being materialized,
+    so memory is bounded by a single image/category/annotation. requires ijson.
     :param jsonFile: path of json file
-    :return: list of cocoInfo
+    :return: generator of (section, item), section is 'images', 'categories' or 'annotations'
+    """
+    try:
+        import ijson
+    except ImportError:
+        raise ImportError('Streaming coco json requires ijson, please run `pip install ijson`.')
+
+    with open(jsonFile, 'rb') as f:
+        item = {}
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            field = COCO_FIELDS.get(prefix)
+            if field is not None:
+                item[field] = value
+            elif prefix == 'annotations.item.bbox.item':
+                item.setdefault('bbox', []).append(value)
+            elif event == 'end_map' and prefix in COCO_SECTIONS:
+                yield COCO_SECTIONS[prefix], item
+                item = {}
+
+def iterCocoJson(jsonFile):
+    """
+    load a whole coco json file with json.load
+    :param jsonFile: path of json file
+    :return: generator of (section, item), same as iterCoco
     """
     with open(jsonFile) as f:
         jsonData = json.load(f)
-        categories_dict = {categories['id']: categories['name'] for categories in jsonData['categories']}
-
-        info_dict = {}
-        for image in jsonData['images']:
-            cocoInfo = {'file': image['file_name'], 'filename': image['file_name'], 
-                'width': image['width'], 'height': image['height'], 'bndbox': []}
-            info_dict[image['id']] = cocoInfo
-        for annotation in jsonData['annotations']:
-            xmin = annotation['bbox'][0]
-            ymin = annotation['bbox'][1]
-            xmax = str(float(xmin) + (float(annotation['bbox'][2])))
-            ymax = str(float(ymin) + (float(annotation['bbox'][3])))
-            tempBox = {'objName': categories_dict[annotation['category_id']], 
-                'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}
-
-            info_dict[annotation['image_id']]['bndbox'].append(tempBox)
-        return list(info_dict.values())
\ No newline at end of file
+    for section in ['images', 'categories', 'annotations']:
+        for item in jsonData[section]:
+            yield section, item
+
+def readCoco(jsonFile, stream=False, cache=None):
+    """
+    read coco json file
+    :param jsonFile: path of json file
+    :param stream: parse incrementally with iterCoco instead of json.load, for files larger than RAM
+    :param cache: AnnotationCache, the json file is only parsed again when it changed
+    :return: AnnotationTable
+    """
+    if cache is not None:
+        table = cache.get(jsonFile)
+        if table is not None:
+            print(f'{jsonFile} loaded from cache.')
+            return table
+
+    # coco ids may be any json value, they are only translated to rows by cocoTable
+    images, categories = [], []
+    annImageIds, annCategoryIds, bbox = [], [], array('d')
+    with stage('parse json') as record:
+        for section, item in (iterCoco(jsonFile) if stream else iterCocoJson(jsonFile)):
+            if section == 'annotations':
+                annImageIds.append(item['image_id'])
+                annCategoryIds.append(item['category_id'])
+                bbox.extend(item['bbox'])
+            elif section == 'images':
+                images.append(item)
+            else:
+                categories.append(item)
+        record['items'] = len(annImageIds)
+
+    with stage('build table', len(annImageIds)):
+        table = cocoTable(images, categories, annImageIds, annCategoryIds, bbox)
+    if cache is not None:
+        cache.put(jsonFile, table)
+    return table
+
+def cocoTable(images, categories, annImageIds, annCategoryIds, bbox):
+    """
+    join the parsed coco sections into an AnnotationTable
+    """
+    categoryIndex = {}
+    cocoCategories = {}
+    for category in categories:
+        cocoCategories[category['id']] = categoryIndex.setdefault(category['name'], len(categoryIndex))
+    imageIndex = {image['id']: i for i, image in enumerate(images)}
+
+    imageIds = np.fromiter((imageIndex[i] for i in annImageIds), dtype=np.int64, count=len(annImageIds))
+    categoryIds = np.fromiter((cocoCategories[c] for c in annCategoryIds), dtype=np.int64, count=len(annCategoryIds))
+    bbox = np.frombuffer(bbox, dtype=np.float64).reshape(-1, 4)
+
+    return AnnotationTable([image['file_name'] for image in images],
+                           [image['file_name'] for image in images],
+                           [image['width'] for image in images],
+                           [image['height'] for image in images],
+                           list(categoryIndex), imageIds, categoryIds,
+                           bbox[:, 0], bbox[:, 1], bbox[:, 0] + bbox[:, 2], bbox[:, 1] + bbox[:, 3])
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp'}
+
+def yoloBoxes(text):
+    """
+    parse one yolo label file, lines are 'class cx cy w h' or 'class x1 y1 x2 y2 ...' polygons, normalized
+    :param text: content of the label file
+    :return: (n, 5) array of class, cx, cy, w, h, polygons are replaced by their bounding box
+    :raise ValueError: on a line with a wrong number of values or a value that is not a number
+    """
+    lines = [line.split() for line in text.splitlines()]
+    lines = [(i, fields) for i, fields in enumerate(lines, 1) if fields]
+    for i, fields in lines:
+        if len(fields) != 5 and (len(fields) < 7 or len(fields) % 2 == 0):
+            raise ValueError(f'line {i} has {len(fields)} values, expected 5 or a class and at least 3 points')
+    if all(len(fields) == 5 for _, fields in lines):
+        with warnings.catch_warnings():
+            # older numpy warns and stops early on a bad value instead of raising
+            warnings.simplefilter('ignore', DeprecationWarning)
+            try:
+                values = np.fromstring(text, sep=' ') if lines else np.zeros(0)
+            except ValueError:
+                values = None
+        if values is not None and len(values) == 5 * len(lines):
+            return values.reshape(-1, 5)
+    rows = []
+    for i, fields in lines:
+        try:
+            v = np.asarray(fields, dtype=np.float64)
+        except ValueError as e:
+            raise ValueError(f'line {i}: {e}')
+        xs, ys = v[1::2], v[2::2]
+        rows.append(v if len(v) == 5 else
+                    [v[0], (xs.min() + xs.max()) / 2, (ys.min() + ys.max()) / 2, xs.max() - xs.min(), ys.max() - ys.min()])
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+def readNames(namesFile):
+    """
+    :param namesFile: text file with one category name per line, e.g. classes.txt or obj.names
+    :return: list of names, the line number is the class id
+    """
+    with open(namesFile) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def readYolo(labelPath, imageDir=None, names=None, shard=None):
+    """
+    read a directory of yolo txt label files, all boxes are parsed at once with numpy
+    every image of imageDir is read, images without a label file are background images without boxes.
+    image sizes are read from the image headers. unreadable images, malformed label files and
+    label files without an image are skipped and listed at the end
+    :param labelPath: label directory, one txt file per image
+    :param imageDir: image directory, by default labelPath with its 'labels' component replaced by 'images'
+    :param names: category names file, by default classes.txt in labelPath or its parent, else class ids are used
+    :param shard: (index, count), only read the index-th of count consecutive blocks of images
+    :return: AnnotationTable
+    """
+    from utils.validate import probeImages
+    labelPath = os.path.normpath(labelPath)
+    labels = {os.path.splitext(os.path.basename(p))[0]: p for p in glob.glob(os.path.join(labelPath, '*.txt'))
+              if os.path.basename(p) != 'classes.txt'}
+    if imageDir is None:
+        parts = labelPath.split(os.sep)
+        imageDir = os.sep.join('images' if p == 'labels' else p for p in parts)
+    if names is None:
+        names = next((p for p in [os.path.join(labelPath, 'classes.txt'), os.path.join(os.path.dirname(labelPath), 'classes.txt')]
+                      if os.path.exists(p)), None)
+    categories = readNames(names) if names is not None else []
+
+    images = {}
+    for filename in sorted(os.listdir(imageDir) if os.path.isdir(imageDir) else []):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            images.setdefault(stem, filename)
+    errors = [(label, f'has no image in {imageDir}') for stem, label in sorted(labels.items()) if stem not in images]
+    stems = sorted(images)
+    if shard is not None:
+        stems = stems[slice(*shardBounds(len(stems), shard))]
+    filenames = [images[stem] for stem in stems]
+
+    imagesW, imagesH, _, probeErrors = probeImages([os.path.join(imageDir, f) for f in filenames])
+    keep = imagesW >= 0
+    errors += [(os.path.join(imageDir, f), error) for f, error in zip(filenames, probeErrors) if error is not None]
+    boxes = []
+    for i, stem in enumerate(stems):
+        boxes.append(np.zeros((0, 5)))
+        if keep[i] and stem in labels:
+            try:
+                with open(labels[stem]) as f:
+                    boxes[i] = yoloBoxes(f.read())
+            except (OSError, ValueError) as e:
+                errors.append((labels[stem], f'{type(e).__name__}: {e}'))
+                keep[i] = False
+    stems = [s for s, k in zip(stems, keep) if k]
+    filenames = [f for f, k in zip(filenames, keep) if k]
+    files = [labels.get(stem, os.path.join(imageDir, filename)) for stem, filename in zip(stems, filenames)]
+    imagesW, imagesH = imagesW[keep], imagesH[keep]
+    boxes = [b for b, k in zip(boxes, keep) if k]
+    imageIds = np.repeat(np.arange(len(files)), [len(b) for b in boxes])
+    boxes = np.concatenate(boxes + [np.zeros((0, 5))])
+    categoryIds = boxes[:, 0].astype(np.int64)
+    categories += [str(c) for c in range(len(categories), categoryIds.max() + 1 if len(categoryIds) else 0)]
+    W, H = imagesW[imageIds], imagesH[imageIds]
+    x1, y1 = (boxes[:, 1] - boxes[:, 3] / 2) * W, (boxes[:, 2] - boxes[:, 4] / 2) * H
+
+    if errors:
+        print('\n============ Errors ============\n')
+        for path, error in errors:
+            print(path, error)
+        print(f'{len(errors)} label or image files were skipped.')
+        print('\n============ Errors ============\n')
+    return AnnotationTable(files, filenames, imagesW, imagesH, categories, imageIds, categoryIds,
+                           x1, y1, x1 + boxes[:, 3] * W, y1 + boxes[:, 4] * H)
+
+# accepted header names of each csv column, compared case-insensitively
+CSV_COLUMNS = {
+    'filename': ['filename', 'file_name', 'file', 'image', 'image_path', 'path'],
+    'width': ['width', 'w', 'image_width'],
+    'height': ['height', 'h', 'image_height'],
+    'class': ['class', 'label', 'category', 'name', 'class_name'],
+    'xmin': ['xmin', 'x1', 'x_min', 'left'],
+    'ymin': ['ymin', 'y1', 'y_min', 'top'],
+    'xmax': ['xmax', 'x2', 'x_max', 'right'],
+    'ymax': ['ymax', 'y2', 'y_max', 'bottom'],
+}
+
+CSV_STRINGS = ['filename', 'class']
+CSV_NUMBERS = ['width', 'height', 'xmin', 'ymin', 'xmax', 'ymax']
+
+def padCsvLines(f, width, fill=''):
+    """
+    :param f: open csv file
+    :param width: number of columns of the header
+    :param fill: text written into empty cells, e.g. 'nan' for float columns
+    :return: generator of the non-blank lines, short rows padded with empty cells to width columns
+    """
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            line += ',' * (width - 1 - line.count(','))
+            if fill and (',,' in line or line.endswith(',')):
+                line = line.replace(',,', f',{fill},').replace(',,', f',{fill},')
+                if line.endswith(','):
+                    line += fill
+            yield line
+
+def loadCsvArrow(csvFile, columns, width):
+    """
+    load the needed csv columns with pyarrow.csv, strings are dictionary-encoded while parsing
+    short rows, e.g. image-only rows without trailing commas, are collected and parsed with csv.reader
+    :param columns: {name of CSV_COLUMNS: column index}
+    :param width: number of columns of the header
+    :return: ({'filename', 'class'}: (values, codes)), (n, 6) float array of CSV_NUMBERS, nan for empty cells
+    """
+    import csv
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    short = []
+    def shortRow(row):
+        short.append(row.text)
+        return 'skip'
+
+    names = {name: f'c{columns[name]}' for name in CSV_STRINGS + CSV_NUMBERS}
+    types = {names[name]: pa.dictionary(pa.int32(), pa.string()) for name in CSV_STRINGS}
+    types.update({names[name]: pa.float64() for name in CSV_NUMBERS})
+    table = pacsv.read_csv(csvFile, read_options=pacsv.ReadOptions(skip_rows=1, column_names=[f'c{i}' for i in range(width)]),
+                           parse_options=pacsv.ParseOptions(invalid_row_handler=shortRow),
+                           convert_options=pacsv.ConvertOptions(include_columns=list(types), column_types=types,
+                                                                strings_can_be_null=False)).unify_dictionaries()
+    rows = [row + [''] * (width - len(row)) for row in csv.reader(short)]
+
+    strings = {}
+    for name in CSV_STRINGS:
+        chunks = table.column(names[name]).chunks
+        values = chunks[0].dictionary.to_pylist() if chunks else []
+        codes = [c.indices.to_numpy(zero_copy_only=False).astype(np.int64) for c in chunks]
+        strings[name] = (values + [row[columns[name]] for row in rows],
+                         np.concatenate(codes + [len(values) + np.arange(len(rows), dtype=np.int64)]))
+    numbers = np.stack([table.column(names[name]).to_numpy() for name in CSV_NUMBERS], axis=1).astype(np.float64)
+    shortNumbers = [[float(row[columns[name]]) if row[columns[name]].strip() else np.nan for name in CSV_NUMBERS]
+                    for row in rows]
+    return strings, np.concatenate([numbers, np.array(shortNumbers, dtype=np.float64).reshape(-1, 6)])
+
+def loadCsvNumpy(csvFile, columns, width):
+    """
+    load the needed csv columns with np.loadtxt, the string and the float columns in two passes.
+    cells are not unquoted, pyarrow is needed for csv files with quoted cells
+    :return: same as loadCsvArrow
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)  # header-only file
+        with open(csvFile, newline='') as f:
+            text = np.loadtxt(padCsvLines(f, width), delimiter=',', skiprows=1, comments=None, dtype=str,
+                              usecols=[columns[name] for name in CSV_STRINGS]).reshape(-1, len(CSV_STRINGS))
+        with open(csvFile, newline='') as f:
+            numbers = np.loadtxt(padCsvLines(f, width, 'nan'), delimiter=',', skiprows=1, comments=None,
+                                 dtype=np.float64, usecols=[columns[name] for name in CSV_NUMBERS])
+    strings = {}
+    for i, name in enumerate(CSV_STRINGS):
+        values, codes = np.unique(text[:, i], return_inverse=True)
+        strings[name] = (values.tolist(), codes.ravel())
+    return strings, numbers.reshape(-1, len(CSV_NUMBERS))
+
+def readCsv(csvFile, shard=None):
+    """
+    read a flat csv export with one box per row, e.g. filename,width,height,class,xmin,ymin,xmax,ymax
+    rows without a class or box only declare an image, their trailing empty cells may be left out.
+    only the needed columns are loaded, in bulk with pyarrow.csv when it is installed, else with np.loadtxt,
+    and images and categories are grouped with np.unique
+    :param csvFile: path of csv file
+    :param shard: (index, count), only keep the index-th of count consecutive blocks of images
+    :return: AnnotationTable
+    """
+    import csv
+    with open(csvFile, newline='') as f:
+        header = [h.strip().lower() for h in next(csv.reader(f))]
+    columns = {}
+    for name, aliases in CSV_COLUMNS.items():
+        index = next((header.index(a) for a in aliases if a in header), None)
+        if index is None:
+            raise ValueError(f'{csvFile} has no {name} column, expected one of {aliases}')
+        columns[name] = index
+
+    try:
+        try:
+            strings, numbers = loadCsvArrow(csvFile, columns, len(header))
+        except ImportError:
+            strings, numbers = loadCsvNumpy(csvFile, columns, len(header))
+    except ValueError as e:
+        raise ValueError(f'{csvFile}: {e}')
+
+    values, codes = strings['filename']
+    filenames, inverse = np.unique(np.array(values, dtype=str), return_inverse=True)
+    rowImages = inverse.ravel()[codes]
+    first = np.unique(rowImages, return_index=True)[1]
+    values, codes = strings['class']
+    classes, inverse = np.unique(np.array(values, dtype=str), return_inverse=True)
+    rowClasses = inverse.ravel()[codes]
+    empty = int(len(classes) > 0 and classes[0] == '')  # '' sorts first, rows without a class have no box
+    hasBox = rowClasses >= empty
+
+    size, box = numbers[first, :2], numbers[hasBox, 2:]
+    for bad, what in [(~np.isfinite(size).all(axis=1), 'width or height'),
+                      (~np.isfinite(box).all(axis=1), 'box coordinate')]:
+        if bad.any():
+            example = filenames[bad.argmax()] if what == 'width or height' else filenames[rowImages[hasBox][bad.argmax()]]
+            raise ValueError(f'{csvFile} has {bad.sum()} rows with a missing or invalid {what}, e.g. for {example}')
+
+    table = AnnotationTable([csvFile] * len(filenames), filenames.tolist(), size[:, 0], size[:, 1],
+                            classes[empty:].tolist(), rowImages[hasBox], rowClasses[hasBox] - empty,
+                            box[:, 0], box[:, 1], box[:, 2], box[:, 3])
+    if shard is not None:
+        table = table.sliceImages(*shardBounds(table.imagesNum, shard))
+    return table
+
+class Reader:
+    """
+    a dataset format of READERS, turns a dataset path into AnnotationTable(s)
+    every method takes the same options and ignores those that do not apply to its format:
+    stream, workers, cache (AnnotationCache), shard ((index, count)), imageDir, names
+    """
+    # whether the reader uses the cache option, no cache file is created for the others
+    cached = False
+
+    def table(self, path, **options):
+        """
+        :return: AnnotationTable of the whole dataset, or of the shard
+        """
+        raise NotImplementedError
+
+    def chunks(self, path, chunkSize, **options):
+        """
+        :return: iterable of AnnotationTable of chunkSize complete images, for streaming mode
+        """
+        return self.table(path, **options).iterChunks(chunkSize)
+
+    def visualizeJobs(self, imagePath, path, outPath, **options):
+        """
+        :return: iterable of (image path, output path, boxes) jobs of visualize.renderImage
+        """
+        table = self.table(path, imageDir=imagePath, **options)
+        boxes = table.boxes()
+        offsets = table.imageOffsets()  # boxes of image i are boxes[offsets[i]:offsets[i + 1]]
+        return ((os.path.join(imagePath, filename), os.path.join(outPath, os.path.basename(filename)),
+                 boxes[offsets[i]:offsets[i + 1]]) for i, filename in enumerate(table.filenames))
+
+
+class CocoReader(Reader):
+    cached = True
+
+    def table(self, path, stream=False, cache=None, shard=None, **options):
+        table = readCoco(path, stream=stream, cache=cache)
+        return table if shard is None else table.sliceImages(*shardBounds(table.imagesNum, shard))
+
+    def chunks(self, path, chunkSize, stream=False, **options):
+        # json.load would hold the whole raw file, streaming mode always parses it incrementally
+        return self.table(path, stream=True, **options).iterChunks(chunkSize)
+
+
+class VocReader(Reader):
+    cached = True
+
+    def table(self, path, workers=1, cache=None, shard=None, **options):
+        return readVoc(path, workers=workers, cache=cache, shard=shard)
+
+    def chunks(self, path, chunkSize, workers=1, cache=None, shard=None, **options):
+        return chunkRecords(iterVoc(path, workers=workers, cache=cache, shard=shard), chunkSize)
+
+    def visualizeJobs(self, imagePath, path, outPath, **options):
+        # the xml files are parsed by the render workers
+        return ((os.path.join(imagePath, imgName), os.path.join(outPath, imgName),
+                 os.path.join(path, f'{os.path.splitext(imgName)[0]}.xml')) for imgName in os.listdir(imagePath))
+
+
+class YoloReader(Reader):
+    def table(self, path, shard=None, imageDir=None, names=None, **options):
+        return readYolo(path, imageDir=imageDir, names=names, shard=shard)
+
+
+class CsvReader(Reader):
+    def table(self, path, shard=None, **options):
+        return readCsv(path, shard=shard)
+
+
+READERS = {'coco': CocoReader(), 'voc': VocReader(), 'yolo': YoloReader(), 'csv': CsvReader()}
+
+def registerReader(name, reader):
+    """
+    add a dataset format, it becomes a valid type of analyze.py and visualize.py
+    :param name: format name
+    :param reader: Reader
+    """
+    READERS[name] = reader
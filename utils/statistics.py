@@ -0,0 +1,327 @@
+import json
+
+import numpy as np
+
+from utils.data import calculateAnchorRatio, countValues, firstAppearanceOrder, getSizeType
+from utils.overlap import overlapStatistics
+from utils.profiling import stage
+
+
+COUNT_NAMES = ['anchorRatioNum', 'eachCategoriesNum', 'eachCategoryImageNum',
+               'eachImageCategoryNum', 'eachImageBboxNum', 'sizeBboxNum',
+               'overlapNeighbourNum', 'overlapMaxIoUNum', 'eachCategoryOverlapNum']
+
+
+def mergeCounts(counts, other):
+    for k, v in other.items():
+        counts[k] = counts.get(k, 0) + v
+
+
+class Statistics:
+    """
+    every statistic of a dataset, computed once and shared by Draw and Excel
+    """
+    def __init__(self):
+        self.imagesNum = 0
+        self.bboxNum = 0
+        self.imagesWH = [np.zeros(0), np.zeros(0)]
+        self.bboxsWH = [np.zeros(0), np.zeros(0)]
+        self.anchorRatioNum = {}
+        self.eachCategoriesNum = {}
+        self.eachCategoriesBbox = {}
+        self.eachCategoryImageNum = {}
+        self.eachImageCategoryNum = {}
+        self.eachImageBboxNum = {}
+        self.sizeBboxNum = dict.fromkeys(['small', 'medium', 'large'], 0)
+        # set when imagesWH / bboxsWH / eachCategoriesBbox only hold a sample, see StatisticsAccumulator
+        self.imageWHGrid = None
+        self.bboxWHGrid = None
+        # set by utils.anchors.clusterAnchors
+        self.anchors = None
+        # set by utils.overlap.overlapStatistics, empty unless overlaps are analyzed
+        self.overlapNeighbourNum = {}
+        self.overlapMaxIoUNum = {}
+        self.eachCategoryOverlapNum = {}
+        self.duplicates = []
+
+    @classmethod
+    def fromTable(cls, table, overlap=None):
+        """
+        compute every statistic from an AnnotationTable
+        :param table: AnnotationTable
+        :param overlap: keyword arguments of utils.overlap.overlapStatistics, None to skip the box overlap statistics
+        :return: Statistics
+        """
+        stats = cls()
+        nc = len(table.categories)
+        bboxW, bboxH = table.bboxWH()
+
+        stats.imagesNum = table.imagesNum
+        stats.imagesWH = [table.imagesW, table.imagesH]
+        stats.bboxsWH = [bboxW, bboxH]
+
+        anchorRatios = calculateAnchorRatio(bboxW, bboxH)
+        for i in np.flatnonzero(anchorRatios == -1):
+            print('\n============ Errors ============\n')
+            print(table.files[table.imageIds[i]], 'Image has wrong height and width.')
+            print('\n============ Errors ============\n')
+        anchorRatios = anchorRatios[anchorRatios != -1]
+        stats.anchorRatioNum = countValues(anchorRatios)
+        stats.bboxNum = len(anchorRatios)
+
+        categoryOrder = firstAppearanceOrder(table.categoryIds)
+        categoryNum = np.bincount(table.categoryIds, minlength=nc)
+        stats.eachCategoriesNum = {table.categories[c]: int(categoryNum[c]) for c in categoryOrder}
+
+        byCategory = np.argsort(table.categoryIds, kind='stable')
+        splits = np.cumsum(categoryNum)[:-1]
+        categoryW = np.split(bboxW[byCategory], splits)
+        categoryH = np.split(bboxH[byCategory], splits)
+        stats.eachCategoriesBbox = {table.categories[c]: [categoryW[c], categoryH[c]] for c in categoryOrder}
+
+        # distinct (image, category) pairs
+        pairs = np.unique(table.imageIds * nc + table.categoryIds)
+        categoryImageNum = np.bincount(pairs % nc, minlength=nc) if nc else categoryNum
+        stats.eachCategoryImageNum = {table.categories[c]: int(categoryImageNum[c]) for c in categoryOrder}
+
+        imageCategoryNum = np.bincount(pairs // nc, minlength=stats.imagesNum) if nc else np.zeros(stats.imagesNum, dtype=np.int64)
+        counts = np.bincount(imageCategoryNum)
+        stats.eachImageCategoryNum = {int(n): int(counts[n]) for n in firstAppearanceOrder(imageCategoryNum)}
+
+        stats.eachImageBboxNum = countValues(np.bincount(table.imageIds, minlength=stats.imagesNum))
+
+        sizeNum = np.bincount(getSizeType(bboxW, bboxH), minlength=4)
+        stats.sizeBboxNum = {'small': int(sizeNum[1]), 'medium': int(sizeNum[2]), 'large': int(sizeNum[3])}
+
+        if overlap is not None:
+            with stage('overlap', table.bboxNum):
+                for name, value in overlapStatistics(table, **overlap).items():
+                    setattr(stats, name, value)
+        return stats
+
+    def mergeCounts(self, other):
+        """
+        add the counts of other, statistics of a disjoint set of images, to self
+        W & H values are left untouched
+        :param other: Statistics
+        """
+        self.imagesNum += other.imagesNum
+        self.bboxNum += other.bboxNum
+        for name in COUNT_NAMES:
+            mergeCounts(getattr(self, name), getattr(other, name))
+        self.anchorRatioNum = dict(sorted(self.anchorRatioNum.items()))
+        self.eachImageBboxNum = dict(sorted(self.eachImageBboxNum.items()))
+        self.overlapNeighbourNum = dict(sorted(self.overlapNeighbourNum.items()))
+        self.overlapMaxIoUNum = dict(sorted(self.overlapMaxIoUNum.items()))
+        self.duplicates = self.duplicates + other.duplicates
+
+    def merge(self, other):
+        """
+        add other, statistics of the images following self's, to self, W & H values included
+        merging the statistics of consecutive blocks of images in order gives the statistics of all of them
+        :param other: Statistics
+        """
+        self.mergeCounts(other)
+        self.imagesWH = [np.concatenate([a, b]) for a, b in zip(self.imagesWH, other.imagesWH)]
+        self.bboxsWH = [np.concatenate([a, b]) for a, b in zip(self.bboxsWH, other.bboxsWH)]
+        for c, wh in other.eachCategoriesBbox.items():
+            if c in self.eachCategoriesBbox:
+                wh = [np.concatenate([a, b]) for a, b in zip(self.eachCategoriesBbox[c], wh)]
+            self.eachCategoriesBbox[c] = wh
+
+    def save(self, path, shard=(0, 1)):
+        """
+        write the statistics to a compressed npz file
+        :param path: npz file path
+        :param shard: (index, count) of the shard these statistics cover
+        """
+        categories = list(self.eachCategoriesBbox)
+        categoryBbox = [self.eachCategoriesBbox[c] for c in categories]
+        counts = {name: list(getattr(self, name).items()) for name in COUNT_NAMES}
+        counts.update(imagesNum=self.imagesNum, bboxNum=self.bboxNum, duplicates=self.duplicates)
+        np.savez_compressed(path,
+                            shard=np.array(shard),
+                            counts=np.array(json.dumps(counts)),
+                            imagesW=self.imagesWH[0], imagesH=self.imagesWH[1],
+                            bboxW=self.bboxsWH[0], bboxH=self.bboxsWH[1],
+                            categories=np.array(categories, dtype=str),
+                            categoryBboxNum=np.array([len(w) for w, _ in categoryBbox], dtype=np.int64),
+                            categoryW=np.concatenate([w for w, _ in categoryBbox] + [np.zeros(0)]),
+                            categoryH=np.concatenate([h for _, h in categoryBbox] + [np.zeros(0)]))
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: npz file written by save
+        :return: Statistics, (shard index, shard count)
+        """
+        stats = cls()
+        with np.load(path) as data:
+            counts = json.loads(str(data['counts']))
+            for name in COUNT_NAMES:
+                setattr(stats, name, dict((k, v) for k, v in counts[name]))
+            stats.imagesNum = counts['imagesNum']
+            stats.bboxNum = counts['bboxNum']
+            stats.duplicates = counts['duplicates']
+            stats.imagesWH = [data['imagesW'], data['imagesH']]
+            stats.bboxsWH = [data['bboxW'], data['bboxH']]
+            splits = np.cumsum(data['categoryBboxNum'])[:-1]
+            categoryW = np.split(data['categoryW'], splits)
+            categoryH = np.split(data['categoryH'], splits)
+            stats.eachCategoriesBbox = {str(c): [w, h] for c, w, h in zip(data['categories'], categoryW, categoryH)}
+            shard = tuple(int(v) for v in data['shard'])
+        return stats, shard
+
+    @staticmethod
+    def loadShard(path):
+        """
+        :param path: npz file written by save
+        :return: (shard index, shard count), without loading the statistics
+        """
+        with np.load(path) as data:
+            return tuple(int(v) for v in data['shard'])
+
+    @staticmethod
+    def checkShards(shards):
+        """
+        :param shards: (shard index, shard count) of every partial file
+        :raise ValueError: unless there is exactly one partial file for each shard of the same count
+        """
+        if not shards:
+            raise ValueError('No partial statistics files to merge.')
+        shards = sorted(shards)
+        shardNum = shards[0][1]
+        if shards != [(i, shardNum) for i in range(shardNum)]:
+            raise ValueError(f'Expected one partial file for each of the {shardNum} shards, got shards '
+                             f'{[i for i, _ in shards]} of {sorted(set(n for _, n in shards))}.')
+
+    @classmethod
+    def mergeFiles(cls, paths):
+        """
+        merge the partial statistics of every shard of a dataset
+        :param paths: npz files written by save, one per shard, in any order
+        :return: Statistics of the whole dataset
+        """
+        partials = sorted((cls.load(path) + (path,) for path in paths), key=lambda p: p[1])
+        cls.checkShards([shard for _, shard, _ in partials])
+        stats = cls()
+        for partial, _, _ in partials:
+            stats.merge(partial)
+        return stats
+
+
+class ReservoirSample:
+    """
+    uniform sample of at most size (w, h) points from a stream of arrays
+    """
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.points = np.zeros((size, 2))
+
+    def add(self, w, h):
+        points = np.stack([w, h], axis=1)
+        # fill the free slots first
+        free = min(max(self.size - self.seen, 0), len(points))
+        self.points[self.seen:self.seen + free] = points[:free]
+        self.seen += free
+        points = points[free:]
+        if len(points):
+            # algorithm R: point i of the stream replaces a random slot with probability size / (i + 1)
+            slots = self.rng.integers(0, self.seen + np.arange(1, len(points) + 1))
+            keep = slots < self.size
+            self.points[slots[keep]] = points[keep]
+            self.seen += len(points)
+
+    def result(self):
+        points = self.points[:min(self.seen, self.size)]
+        return [points[:, 0], points[:, 1]]
+
+
+class WHGrid:
+    """
+    2D histogram of (w, h) with a fixed bin width, grown as larger values arrive
+    """
+    def __init__(self, binSize=8, maxBins=2048):
+        """
+        :param binSize: bin width in pixels
+        :param maxBins: bins per axis, larger values are counted in the last bin
+        """
+        self.binSize = binSize
+        self.maxBins = maxBins
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def edges(self):
+        """
+        :return: w edges, h edges
+        """
+        return np.arange(self.counts.shape[0] + 1) * self.binSize, np.arange(self.counts.shape[1] + 1) * self.binSize
+
+    def add(self, w, h):
+        i = np.clip(np.asarray(w) // self.binSize, 0, self.maxBins - 1).astype(np.int64)
+        j = np.clip(np.asarray(h) // self.binSize, 0, self.maxBins - 1).astype(np.int64)
+        if not len(i):
+            return
+        shape = (max(self.counts.shape[0], i.max() + 1), max(self.counts.shape[1], j.max() + 1))
+        if shape != self.counts.shape:
+            counts = np.zeros(shape, dtype=np.int64)
+            counts[:self.counts.shape[0], :self.counts.shape[1]] = self.counts
+            self.counts = counts
+        self.counts += np.bincount(i * shape[1] + j, minlength=shape[0] * shape[1]).reshape(shape)
+
+
+class StatisticsAccumulator:
+    """
+    fold chunks of images into Statistics with memory independent of the number of images:
+    counts are merged, W & H values are kept as reservoir samples for scatters and tables
+    plus fixed-bin grids for density plots
+    """
+    def __init__(self, sampleSize=100000, categorySampleSize=10000, gridBin=8, seed=0, overlap=None):
+        """
+        :param sampleSize: number of image and bbox W & H points kept
+        :param categorySampleSize: number of bbox W & H points kept for each category
+        :param gridBin: bin width in pixels of the W & H grids
+        :param seed: random seed of the samples
+        :param overlap: keyword arguments of utils.overlap.overlapStatistics, None to skip the box overlap statistics
+        """
+        self.overlap = overlap
+        self.rng = np.random.default_rng(seed)
+        self.statistics = Statistics()
+        self.categorySampleSize = categorySampleSize
+        self.imageSample = ReservoirSample(sampleSize, self.rng)
+        self.bboxSample = ReservoirSample(sampleSize, self.rng)
+        self.categorySamples = {}
+        self.imageGrid = WHGrid(gridBin)
+        self.bboxGrid = WHGrid(gridBin)
+
+    def add(self, table):
+        """
+        :param table: AnnotationTable of complete images, i.e. no image has boxes in another chunk
+        """
+        stats = Statistics.fromTable(table, self.overlap)
+        self.statistics.mergeCounts(stats)
+        self.imageSample.add(*stats.imagesWH)
+        self.imageGrid.add(*stats.imagesWH)
+        self.bboxSample.add(*stats.bboxsWH)
+        self.bboxGrid.add(*stats.bboxsWH)
+        for c, (w, h) in stats.eachCategoriesBbox.items():
+            if c not in self.categorySamples:
+                self.categorySamples[c] = ReservoirSample(self.categorySampleSize, self.rng)
+            self.categorySamples[c].add(w, h)
+
+    def result(self):
+        """
+        :return: Statistics, W & H values are samples, full distributions are in imageWHGrid / bboxWHGrid
+        """
+        stats = self.statistics
+        stats.imagesWH = self.imageSample.result()
+        stats.bboxsWH = self.bboxSample.result()
+        stats.eachCategoriesBbox = {c: self.categorySamples[c].result() for c in stats.eachCategoriesNum}
+        stats.imageWHGrid = self.imageGrid
+        stats.bboxWHGrid = self.bboxGrid
+        return stats
@@ -0,0 +1,143 @@
+import numpy as np
+
+
+class AnnotationTable:
+    """
+    column-oriented annotation table shared by all readers
+
+    images are rows of the image columns (files, filenames, imagesW, imagesH),
+    boxes are rows of the box columns (imageIds, categoryIds, x1, y1, x2, y2).
+    imageIds index the image rows, categoryIds index self.categories.
+    boxes are always stored grouped by image, in image order.
+    """
+    def __init__(self, files, filenames, imagesW, imagesH, categories,
+                 imageIds, categoryIds, x1, y1, x2, y2):
+        self.files = list(files)
+        self.filenames = list(filenames)
+        self.imagesW = np.asarray(imagesW, dtype=np.float64)
+        self.imagesH = np.asarray(imagesH, dtype=np.float64)
+        self.categories = list(categories)
+
+        imageIds = np.asarray(imageIds, dtype=np.int64)
+        order = np.argsort(imageIds, kind='stable')
+        self.imageIds = imageIds[order]
+        self.categoryIds = np.asarray(categoryIds, dtype=np.int64)[order]
+        self.x1 = np.asarray(x1, dtype=np.float64)[order]
+        self.y1 = np.asarray(y1, dtype=np.float64)[order]
+        self.x2 = np.asarray(x2, dtype=np.float64)[order]
+        self.y2 = np.asarray(y2, dtype=np.float64)[order]
+
+    @property
+    def imagesNum(self):
+        return len(self.files)
+
+    @property
+    def bboxNum(self):
+        return len(self.imageIds)
+
+    def bboxWH(self):
+        """
+        :return: [w, h] arrays of every box
+        """
+        return [self.x2 - self.x1, self.y2 - self.y1]
+
+    def boxes(self):
+        """
+        :return: (bboxNum, 4) array of [x1, y1, x2, y2]
+        """
+        return np.stack([self.x1, self.y1, self.x2, self.y2], axis=1)
+
+    def imageOffsets(self):
+        """
+        image -> boxes index, boxes of image i are rows offsets[i]:offsets[i + 1]
+        :return: int array of length imagesNum + 1
+        """
+        offsets = np.zeros(self.imagesNum + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.imageIds, minlength=self.imagesNum), out=offsets[1:])
+        return offsets
+
+    @classmethod
+    def fromRecords(cls, records):
+        """
+        build a table from per-image records
+        :param records: iterable of {'file': '', 'filename': '', 'width': w, 'height': h,
+                        'objNames': [], 'boxes': [[xmin, ymin, xmax, ymax], ...]}
+        :return: AnnotationTable
+        """
+        files, filenames, imagesW, imagesH = [], [], [], []
+        categoryIndex = {}
+        imageIds, categoryIds, boxes = [], [], []
+        for i, record in enumerate(records):
+            files.append(record['file'])
+            filenames.append(record['filename'])
+            imagesW.append(float(record['width']))
+            imagesH.append(float(record['height']))
+            for objName in record['objNames']:
+                categoryIds.append(categoryIndex.setdefault(objName, len(categoryIndex)))
+            imageIds.extend([i] * len(record['objNames']))
+            boxes.extend(record['boxes'])
+
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        return cls(files, filenames, imagesW, imagesH, list(categoryIndex),
+                   imageIds, categoryIds, boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3])
+
+    def sliceImages(self, start, end):
+        """
+        :param start: first image row
+        :param end: image row after the last one
+        :return: AnnotationTable of images start:end with all their boxes
+        """
+        offsets = np.searchsorted(self.imageIds, [start, end])
+        boxes = slice(offsets[0], offsets[1])
+        return AnnotationTable(self.files[start:end], self.filenames[start:end],
+                               self.imagesW[start:end], self.imagesH[start:end], self.categories,
+                               self.imageIds[boxes] - start, self.categoryIds[boxes],
+                               self.x1[boxes], self.y1[boxes], self.x2[boxes], self.y2[boxes])
+
+    def selectImages(self, imageIds):
+        """
+        :param imageIds: image rows, in the order of the new table
+        :return: AnnotationTable of these images with all their boxes
+        """
+        imageIds = np.asarray(imageIds, dtype=np.int64)
+        newIds = np.full(self.imagesNum, -1, dtype=np.int64)
+        newIds[imageIds] = np.arange(len(imageIds))
+        keep = newIds[self.imageIds] >= 0
+        return AnnotationTable([self.files[i] for i in imageIds], [self.filenames[i] for i in imageIds],
+                               self.imagesW[imageIds], self.imagesH[imageIds], self.categories,
+                               newIds[self.imageIds[keep]], self.categoryIds[keep],
+                               self.x1[keep], self.y1[keep], self.x2[keep], self.y2[keep])
+
+    def iterChunks(self, chunkSize):
+        """
+        :param chunkSize: number of images per chunk
+        :return: generator of AnnotationTable, every image with all of its boxes
+        """
+        for start in range(0, self.imagesNum, chunkSize):
+            yield self.sliceImages(start, min(start + chunkSize, self.imagesNum))
+
+
+def shardBounds(n, shard):
+    """
+    :param n: number of images
+    :param shard: (index, count)
+    :return: (start, end) of the index-th of count consecutive blocks of n images
+    """
+    index, count = shard
+    return n * index // count, n * (index + 1) // count
+
+def chunkRecords(records, chunkSize):
+    """
+    group per-image records into tables without materializing all of them
+    :param records: iterable of records, see AnnotationTable.fromRecords
+    :param chunkSize: number of images per chunk
+    :return: generator of AnnotationTable
+    """
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunkSize:
+            yield AnnotationTable.fromRecords(chunk)
+            chunk = []
+    if chunk:
+        yield AnnotationTable.fromRecords(chunk)
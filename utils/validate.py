@@ -0,0 +1,100 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# EXIF orientations that display the image rotated by 90 degrees, i.e. with W & H swapped
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def probeImage(path):
+    """
+    read the size of an image from its header, pixels are not decoded
+    :param path: image path
+    :return: (w, h, EXIF orientation), error message or None
+    """
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            orientation = image.getexif().get(0x0112, 1)
+            return (image.width, image.height, orientation), None
+    except FileNotFoundError:
+        return None, 'missing image'
+    except Exception as e:
+        return None, f'unreadable image: {e}'
+
+def probeImages(paths, workers=8):
+    """
+    probe image headers concurrently, the work is mostly file I/O so threads are enough
+    :param paths: image paths
+    :param workers: number of threads
+    :return: w, h, orientation arrays (-1 where the image could not be read), error messages
+    """
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(probeImage, paths))
+    else:
+        results = [probeImage(path) for path in paths]
+    sizes = np.array([size or (-1, -1, 1) for size, _ in results], dtype=np.int64).reshape(-1, 3)
+    return sizes[:, 0], sizes[:, 1], sizes[:, 2], [error for _, error in results]
+
+def validateTable(table, imageDir=None, workers=8, tolerance=0):
+    """
+    check annotated image sizes against the images and boxes against the image bounds
+    :param table: AnnotationTable
+    :param imageDir: directory of the images, None to only check boxes against the annotated sizes
+    :param workers: number of threads probing image headers
+    :param tolerance: pixels a box may exceed the image by before it is reported
+    :return: list of issues {'file', 'image', 'issue', ...}
+    """
+    issues = []
+    imagesW, imagesH = table.imagesW, table.imagesH
+    if imageDir is not None:
+        paths = [os.path.join(imageDir, filename) for filename in table.filenames]
+        w, h, orientation, errors = probeImages(paths, workers)
+        for i, error in enumerate(errors):
+            if error is not None:
+                issues.append({'file': table.files[i], 'image': paths[i], 'issue': error})
+
+        probed = w >= 0
+        mismatch = probed & ((w != table.imagesW) | (h != table.imagesH))
+        # annotated as displayed, i.e. after the EXIF rotation, readers ignoring EXIF get swapped W & H
+        swapped = (mismatch & np.isin(orientation, list(ROTATED_ORIENTATIONS)) &
+                   (w == table.imagesH) & (h == table.imagesW))
+        for i in np.flatnonzero(mismatch):
+            issues.append({'file': table.files[i], 'image': paths[i],
+                           'issue': 'exif rotated size' if swapped[i] else 'size mismatch',
+                           'annotated': [table.imagesW[i].item(), table.imagesH[i].item()],
+                           'actual': [int(w[i]), int(h[i])], 'orientation': int(orientation[i])})
+        # check the boxes against the real size wherever it is known
+        imagesW = np.where(probed & ~swapped, w, table.imagesW)
+        imagesH = np.where(probed & ~swapped, h, table.imagesH)
+
+    W, H = imagesW[table.imageIds], imagesH[table.imageIds]
+    degenerate = (table.x2 <= table.x1) | (table.y2 <= table.y1)
+    outside = ((table.x1 < -tolerance) | (table.y1 < -tolerance) |
+               (table.x2 > W + tolerance) | (table.y2 > H + tolerance))
+    for i in np.flatnonzero(degenerate | outside):
+        image = table.imageIds[i]
+        issues.append({'file': table.files[image], 'image': table.filenames[image],
+                       'issue': 'degenerate box' if degenerate[i] else 'box out of bounds',
+                       'category': table.categories[table.categoryIds[i]],
+                       'box': [table.x1[i].item(), table.y1[i].item(), table.x2[i].item(), table.y2[i].item()],
+                       'size': [imagesW[image].item(), imagesH[image].item()]})
+    return issues
+
+def writeIssues(issues, path):
+    """
+    write the issues and their count by kind to a json file
+    :param issues: result of validateTable
+    :param path: json file path
+    :return: {issue kind: count}
+    """
+    summary = {}
+    for issue in issues:
+        kind = issue['issue'].split(':')[0]
+        summary[kind] = summary.get(kind, 0) + 1
+    with open(path, 'w') as f:
+        json.dump({'summary': summary, 'issues': issues}, f, indent=1)
+    return summary
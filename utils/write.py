@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import xml.etree.ElementTree as ET
+
+
+def toNumber(value):
+    """
+    :return: value as an int when it is a whole number, else as a float
+    """
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def formatNumber(value):
+    """
+    :return: value as text, without a decimal part when it is a whole number
+    """
+    return repr(toNumber(value))
+
+def writeCoco(table, jsonFile, source=None):
+    """
+    write an AnnotationTable as a coco json file
+    :param table: AnnotationTable
+    :param jsonFile: path of json file
+    :param source: coco json file the table was read from. its images of the table are copied with their
+                   annotations, keeping every field and id of the original records. without a source only
+                   the fields read by readCoco are written, with new ids
+    """
+    if source is not None:
+        with open(source) as f:
+            data = json.load(f)
+        keep = set(table.filenames)
+        data['images'] = [image for image in data['images'] if image['file_name'] in keep]
+        imageIds = {image['id'] for image in data['images']}
+        data['annotations'] = [a for a in data['annotations'] if a['image_id'] in imageIds]
+        with open(jsonFile, 'w') as f:
+            json.dump(data, f)
+        return
+
+    images = [{'id': i, 'file_name': f, 'width': toNumber(w), 'height': toNumber(h)}
+              for i, (f, w, h) in enumerate(zip(table.filenames, table.imagesW.tolist(), table.imagesH.tolist()))]
+    w, h = table.bboxWH()
+    annotations = [{'id': i, 'image_id': image, 'category_id': category, 'bbox': [x, y, bw, bh],
+                    'area': bw * bh, 'iscrowd': 0}
+                   for i, (image, category, x, y, bw, bh) in enumerate(zip(
+                       table.imageIds.tolist(), table.categoryIds.tolist(), table.x1.tolist(), table.y1.tolist(),
+                       w.tolist(), h.tolist()))]
+    categories = [{'id': i, 'name': name} for i, name in enumerate(table.categories)]
+    with open(jsonFile, 'w') as f:
+        json.dump({'images': images, 'annotations': annotations, 'categories': categories}, f)
+
+def writeVoc(table, xmlDir):
+    """
+    write an AnnotationTable as voc xml files, one per image.
+    images read from voc xml files are copied, keeping every field of the original file
+    :param table: AnnotationTable
+    :param xmlDir: xml directory
+    """
+    os.makedirs(xmlDir, exist_ok=True)
+    offsets = table.imageOffsets()
+    for i, (file, filename) in enumerate(zip(table.files, table.filenames)):
+        xmlFile = os.path.join(xmlDir, f'{os.path.splitext(os.path.basename(filename))[0]}.xml')
+        if file.endswith('.xml') and os.path.isfile(file):
+            shutil.copyfile(file, xmlFile)
+            continue
+        root = ET.Element('annotation')
+        ET.SubElement(root, 'filename').text = filename
+        size = ET.SubElement(root, 'size')
+        ET.SubElement(size, 'width').text = formatNumber(table.imagesW[i])
+        ET.SubElement(size, 'height').text = formatNumber(table.imagesH[i])
+        for b in range(offsets[i], offsets[i + 1]):
+            obj = ET.SubElement(root, 'object')
+            ET.SubElement(obj, 'name').text = table.categories[table.categoryIds[b]]
+            bndbox = ET.SubElement(obj, 'bndbox')
+            for tag, value in zip(['xmin', 'ymin', 'xmax', 'ymax'], [table.x1, table.y1, table.x2, table.y2]):
+                ET.SubElement(bndbox, tag).text = formatNumber(value[b])
+        ET.ElementTree(root).write(xmlFile)
+
+def writeList(table, listFile):
+    """
+    write the image file names of an AnnotationTable, one per line
+    :param table: AnnotationTable
+    :param listFile: path of the list file
+    """
+    with open(listFile, 'w') as f:
+        f.writelines(f'{filename}\n' for filename in table.filenames)
@@ -1,75 +1,91 @@
 import argparse
-import json
 import os
-from xml.etree import ElementTree as ET
-import cv2
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
+from utils.parallel import boundedMap
+from utils.read import READERS, readXml
+
+
+# names of the cv2 decode flags that let libjpeg/libpng skip pixels for 1/2, 1/4 and 1/8 thumbnails,
+# cv2 is only imported by the render workers
+REDUCED_FLAGS = [(8, 'IMREAD_REDUCED_COLOR_8'), (4, 'IMREAD_REDUCED_COLOR_4'), (2, 'IMREAD_REDUCED_COLOR_2')]
+
+
+def renderImage(job, color=(0, 255, 255), thickness=1, quality=95, scale=1.0):
+    """
+    decode one image, draw its boxes, encode and write it
+    :param job: (image path, output path, boxes), boxes is an (n, 4) array of [x1, y1, x2, y2]
+                or the path of a voc xml file to read them from
+    :param color: bbox color
+    :param thickness: bbox thickness
+    :param quality: jpeg quality of the output
+    :param scale: output size relative to the input image
+    :return: error message, None on success
+    """
+    import cv2
+    imagePath, outFile, boxes = job
+    try:
+        if isinstance(boxes, str):
+            boxes = np.asarray(readXml(boxes)['boxes'], dtype=np.float64).reshape(-1, 4)
+
+        # decode directly at 1/factor size when possible, resize the rest of the way
+        factor, flag = next(((factor, getattr(cv2, f)) for factor, f in REDUCED_FLAGS if scale * factor <= 1), (1, -1))
+        image = cv2.imdecode(np.fromfile(imagePath, dtype=np.uint8), flag)
+        if image is None:
+            return f'{imagePath} could not be decoded.'
+        if scale * factor != 1:
+            h, w = image.shape[:2]
+            image = cv2.resize(image, (max(1, round(w * scale * factor)), max(1, round(h * scale * factor))),
+                               interpolation=cv2.INTER_AREA)
+        boxes = (np.asarray(boxes) * scale).astype(int)
+
+        for x1, y1, x2, y2 in boxes:
+            image = cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), color=color, thickness=thickness)
+        _, encoded = cv2.imencode(os.path.splitext(outFile)[1], image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        encoded.tofile(outFile)
+    except Exception as e:
+        return f'{imagePath} {e}'
 
 
 class DataVisualization:
-    def __init__(self, type, imagePath, labels, outPath, thickness):
+    def __init__(self, type, imagePath, labels, outPath, thickness, streamJson=False, workers=1, quality=95, scale=1.0,
+                 only=None):
+        """
+        :param only: image file names to render, e.g. written by query.py --list, None renders every image
+        :param workers: number of render processes, each one decodes, draws and writes whole images
+        :param quality: jpeg quality of the output images
+        :param scale: output size relative to the input images, e.g. 0.25 for thumbnails
+        """
+        self.workers = workers
+        self.quality = quality
+        self.scale = scale
+        self.only = None if only is None else {os.path.basename(f) for f in only}
 
         if not os.path.exists(outPath):
             os.makedirs(outPath)
 
         print('Processing, please wait...')
 
-        if type == 'coco':
-            self.cocoVisualize(imagePath, labels, outPath, thickness=thickness)
-            
-        elif type == 'voc':
-             self.vocVisualize(imagePath, labels, outPath, thickness=thickness)
-
-    def cocoVisualize(self, imgPath, jsonPath, out, color=(0, 255, 255), thickness=1):
-        # sourcery skip: avoid-builtin-shadow
-        with open(jsonPath, 'r') as f:
-            annotation_json = json.load(f)
-
-        for img in annotation_json['images']:
-            try:
-                image_name = img['file_name']  # 读取图片名
-                id = img['id']  # 读取图片id
-                image_path = os.path.join(imgPath, str(image_name).zfill(5))  # 拼接图像路径
-                image = cv2.imdecode(np.fromfile(image_path,dtype=np.uint8),-1)
-                # image = cv2.imread(image_path, 1)  # 保持原始格式的方式读取图像
-                num_bbox = 0  # 统计一幅图片中bbox的数量
-
-                for i in range(len(annotation_json['annotations'][::])):
-                    if annotation_json['annotations'][i - 1]['image_id'] == id:
-                        num_bbox = num_bbox + 1
-                        x, y, w, h = annotation_json['annotations'][i - 1]['bbox']  # 读取边框
-                        image = cv2.rectangle(image, (int(x), int(y)), (int(x + w), int(y + h)), color=color,
-                                            thickness=thickness)
-                cv2.imwrite(os.path.join(out, image_name), image)
-            except Exception as e:
-                print(e) 
-    
-    def vocVisualize(self, imgPath, xmlPath, out, color=(0, 255, 255), thickness=1):
-        imgList = os.listdir(imgPath)
-        for imgName in imgList:
-            name, _ = os.path.splitext(imgName)
-            img = os.path.join(imgPath, imgName)
-            xml = os.path.join(xmlPath, f'{name}.xml')
-
-            per=ET.parse(xml)
-            image = image = cv2.imdecode(np.fromfile(img, dtype=np.uint8),-1)
-            imgName = img.split(os.sep)[-1]
-            root = per.getroot()
-
-            p=root.findall('object')
-
-            for oneper in p:
-                # print(oneper.find('name').text)
-                bndbox = oneper.find('bndbox')
-                x1 = (int)(bndbox.find('xmin').text)
-                y1 = (int)(bndbox.find('ymin').text)
-                x2 = (int)(bndbox.find('xmax').text)
-                y2 = (int)(bndbox.find('ymax').text)
-                # 各参数依次是：图片，添加的文字，左上角坐标(整数)，字体，字体大小，颜色，字体粗细
-                # cv2.putText(img, oneper.find('name').text, (x1, y1), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-                image = cv2.rectangle(image, (x1, y1), (x2, y2), color=color, thickness=thickness)
-            cv2.imwrite(os.path.join(out, imgName), image)
-    
+        if type in READERS:
+            self.render(READERS[type].visualizeJobs(imagePath, labels, outPath, stream=streamJson), (0, 255, 255), thickness)
+        else:
+            print(f'Currently only {", ".join(READERS)} formats are supported, please check if the first parameter is correct.')
+
+    def render(self, jobs, color, thickness):
+        if self.only is not None:
+            jobs = (job for job in jobs if os.path.basename(job[0]) in self.only)
+        render = partial(renderImage, color=color, thickness=thickness, quality=self.quality, scale=self.scale)
+        if self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for error in boundedMap(executor, render, jobs, self.workers * 2):
+                    if error is not None:
+                        print(error)
+        else:
+            for error in map(render, jobs):
+                if error is not None:
+                    print(error)
+
     def dealChinesePath(self, *paths):
         for p in paths:
             p = p.encode('gbk')
@@ -78,18 +94,30 @@ class DataVisualization:
 
 def parse_args():
     parser = argparse.ArgumentParser(description='dataset visualize')
-    parser.add_argument('type', type=str, help="Dataset format, optional 'voc' and 'coco'")
+    parser.add_argument('type', type=str, help="Dataset format, optional 'voc', 'coco', 'yolo' and 'csv'")
     parser.add_argument('imgPath', type=str, help="Images path")
     parser.add_argument('labels', type=str, help='Labels path, if it is a voc dataset, it corresponds '
                                                'to the xml directory, if it is a coco dataset, it is the json file '
-                                               'path')             
+                                               'path, for yolo the label directory, for csv the csv file')             
     parser.add_argument('--out', type=str, default='visualizeOut', help='Result output directory')
     parser.add_argument('--thickness', type=int, default=1 ,help="label color thickness")     
+    parser.add_argument('--stream-json', action='store_true', help='Parse the coco json file incrementally (requires ijson)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of render processes')
+    parser.add_argument('--quality', type=int, default=95, help='JPEG quality of the output images')
+    parser.add_argument('--scale', type=float, default=1.0, help='Output size relative to the input images, '
+                                                                  'e.g. 0.25 renders quarter size thumbnails')
+    parser.add_argument('--only', type=str, default=None, help='File listing the images to render, one per line, '
+                                                               'e.g. written by query.py --list')
     return parser.parse_args()
 
 def main():
     args = parse_args()
-    DataVisualization(args.type, args.imgPath, args.labels, args.out, args.thickness)
+    only = None
+    if args.only is not None:
+        with open(args.only) as f:
+            only = [line.strip() for line in f if line.strip()]
+    DataVisualization(args.type, args.imgPath, args.labels, args.out, args.thickness, streamJson=args.stream_json,
+                      workers=args.workers, quality=args.quality, scale=args.scale, only=only)
 
 if __name__ == '__main__':
     main()